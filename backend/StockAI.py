@@ -1,4 +1,3 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -6,27 +5,109 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 import xgboost as xgb
 import os
+import time
+import threading
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 import psycopg2
+from psycopg2.extras import execute_values
+import price_store
+import features
+import model_store
+import metrics
+import memory_usage
+import pooled_model
+import refresh_planner
+import json
+import hashlib
 
 # Config
 START_DATE = "2014-01-01"
 END_DATE = "2024-01-01"
 
 DB_HOST = os.getenv('HOST')  
+DB_PORT = os.getenv('PORT')
 DB_NAME = os.getenv('DATABASE')
 DB_USER = os.getenv('USER')
 DB_PASSWORD = os.getenv('PASSWORD')
 
+# number of tickers processed at once by main_ai, 1 keeps the original sequential loop
+AI_WORKERS = int(os.getenv('AI_WORKERS', 1))
+# build features for every ticker in one pass (features.build_feature_panel) instead of per ticker
+AI_PANEL = os.getenv('AI_PANEL', '0') == '1'
+
+# "per_ticker" fits one model per stock, "pooled" one model over all of them (pooled_model)
+AI_ENGINE = os.getenv('AI_ENGINE', "per_ticker")
+ENGINES = ("per_ticker", "pooled")
+
+# streaming mode: process tickers in chunks so the run stays under this many MB of RSS, 0 turns it off
+AI_MEMORY_BUDGET_MB = float(os.getenv('AI_MEMORY_BUDGET_MB', 0))
+# MB of the budget kept free for preparing and training the ticker at hand
+AI_STREAM_RESERVE_MB = float(os.getenv('AI_STREAM_RESERVE_MB', 256))
+# trace per-stage allocations with tracemalloc in streaming mode (slower)
+AI_TRACE_ALLOC = os.getenv('AI_TRACE_ALLOC', '0') == '1'
+# float32 holds every integer up to this exactly, larger share volumes stay float64
+FLOAT32_EXACT_INT = 2 ** 24
+
+# reuse stored models when the training data has not changed, set AI_MODEL_CACHE=0 to always retrain
+AI_MODEL_CACHE = os.getenv('AI_MODEL_CACHE', '1') == '1'
+
+MODEL_PARAMS = {
+    "objective": 'reg:squarederror',
+    "n_estimators": 100,
+    "learning_rate": 0.05,
+    "max_depth": 3,
+    "subsample": 0.7,
+    "colsample_bytree": 0.8,
+    "reg_lambda": 2,
+    "reg_alpha": 1,
+}
+# boosting rounds added when a stored model is continued on new bars
+WARM_START_ROUNDS = 20
+# fewer new training rows than this reuse the stored booster as is, 20 rounds on a few bars would overfit them
+WARM_START_MIN_ROWS = 20
+# past this many trees a warm-started model is refitted from scratch instead
+MAX_WARM_START_TREES = 3 * MODEL_PARAMS["n_estimators"]
+MODEL_PARAMS_HASH = hashlib.sha256(json.dumps(MODEL_PARAMS, sort_keys=True).encode()).hexdigest()
+
+# local stores of daily bars and trained models, created on first use so importing StockAI does not touch the disk
+_price_store = None
+_model_store = None
+_store_lock = threading.Lock()
+
+
+def get_price_store():
+    global _price_store
+    with _store_lock:
+        if _price_store is None:
+            _price_store = price_store.PriceStore()
+    return _price_store
+
+
+def get_model_store():
+    global _model_store
+    if not AI_MODEL_CACHE:
+        return None
+    with _store_lock:
+        if _model_store is None:
+            _model_store = model_store.ModelStore()
+    return _model_store
+
+def get_db_connection():
+    return psycopg2.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD
+    )
+
 def get_stock_tickers_from_db():
     """Fetch all stock tickers from the StockPool table in the PostgreSQL database."""
     try:
         # Connect to your PostgreSQL database
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT stock_ID, ticker_symbol FROM StockPool;")
         tickers = cursor.fetchall()
@@ -40,17 +121,43 @@ def get_stock_tickers_from_db():
         print(f"Failed to fetch tickers from DB: {e}")
         return []
 
+def get_ticker_industries():
+    """{ticker: industry_ID} from the lots users hold, the most common industry where they disagree."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT DISTINCT ON (stock) stock, industry_ID
+            FROM StockEntry
+            GROUP BY stock, industry_ID
+            ORDER BY stock, count(*) DESC, industry_ID
+        """)
+        industries = dict(cursor.fetchall())
+
+        cursor.close()
+        conn.close()
+        return industries
+
+    except Exception as e:
+        print(f"Failed to fetch industries from DB: {e}")
+        return {}
+
 def fetch_stock_data(ticker, start=START_DATE, end=END_DATE):
-    """Fetch stock data for a single ticker."""
-    print(f"Fetching stock data for {ticker} from Yahoo Finance...")
+    """Fetch stock data for a single ticker.
+
+    Bars come from the local price store, only the dates after the last cached bar are
+    downloaded, so a run over unchanged data stays offline.
+    """
+    print(f"Fetching stock data for {ticker}...")
 
     try:
-        data = yf.download(ticker, start=start, end=end)
+        data = get_price_store().get(ticker, start, end)
 
         if data.empty:
             print(f"No data for {ticker}, skipping.")
             return None
 
+        data = price_store.to_download_frame(data, ticker)
         data["Ticker"] = ticker
         return data
 
@@ -59,9 +166,26 @@ def fetch_stock_data(ticker, start=START_DATE, end=END_DATE):
         return None
 
 
-def prepare_data(df, ticker):
-    """Transform raw stock data into model-ready format for a single stock."""
-    df = df.copy()
+def downcast_prices(df):
+    """Store the OHLC prices as float32, and Volume too while float32 holds it exactly.
+
+    XGBoost bins its inputs as float32, so the prices lose nothing the model would have
+    seen; the frame takes about half the memory.
+    """
+    for column in df.columns:
+        field = column[0] if isinstance(column, tuple) else column
+        if field in ("Open", "High", "Low", "Close") or (field == "Volume" and df[column].abs().max() < FLOAT32_EXACT_INT):
+            df[column] = df[column].astype(np.float32)
+    return df
+
+
+def prepare_data(df, ticker, copy=True):
+    """Transform raw stock data into model-ready format for a single stock.
+
+    copy=False transforms df in place, for a caller that drops the raw frame anyway.
+    """
+    if copy:
+        df = df.copy()
 
     # Check if the index is already 'Date', if so, no need to set it
     if df.index.name != 'Date':
@@ -77,26 +201,79 @@ def prepare_data(df, ticker):
     return df
 
 
-def train_model(df, ticker, predicted_gains):
-    """Train and evaluate the XGBoost model for a single stock's future high price."""
+def _training_hash(X, y, rows=None):
+    """Hash of the first `rows` training rows, dates included, so appended bars can be recognised."""
+    rows = len(X) if rows is None else rows
+    return model_store.hash_arrays(X.index[:rows].asi8, X.to_numpy(dtype=np.float64)[:rows], y.to_numpy(dtype=np.float64)[:rows])
+
+
+def train_model(df, ticker, predicted_gains, n_jobs=None, store=None, outcomes=None):
+    """Train and evaluate the XGBoost model for a single stock's future high price.
+
+    n_jobs caps XGBoost's own threads so parallel workers do not oversubscribe the cores,
+    None lets XGBoost use all of them.
+
+    With a model store, a ticker whose data is unchanged reuses its stored prediction, one
+    whose training rows gained WARM_START_MIN_ROWS or more new bars continues boosting from
+    the stored booster, one with fewer new bars reuses the booster as is, and anything else is trained from scratch. The outcome (model_store.HIT, WARM or MISS)
+    is recorded in outcomes[ticker].
+    """
     X = df[[("MA5", ticker)]]
     y = df[("Future_High", ticker)]
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
 
-    print(f"Training XGBoost model for {ticker}...")
-    model = xgb.XGBRegressor(
-        objective='reg:squarederror',
-        n_estimators=100,
-        learning_rate=0.05,
-        max_depth=3,
-        subsample=0.7,
-        colsample_bytree=0.8,
-        reg_lambda=2,
-        reg_alpha=1
-    )
+    # streaming mode trains on float32 bars, whose features and labels differ from the float64 ones,
+    # so a stored model is only reused by a run of the same precision (the labels keep the bars' dtype)
+    precision = np.dtype(y.dtype).name
+    meta = store.metadata(ticker) if store else None
+    if meta and (meta["feature_set_version"] != features.FEATURE_SET_VERSION or meta["params_hash"] != MODEL_PARAMS_HASH
+                 or meta.get("precision", "float64") != precision):
+        meta = None
+    data_hash = _training_hash(X, y) if store else None
+    train_hash = _training_hash(X_train, y_train) if store else None
+
+    if meta and meta["data_hash"] == data_hash:
+        print(f"Data for {ticker} unchanged, reusing stored model (predicted gain {meta['predicted_gain']:.2f}%)")
+        if outcomes is not None:
+            outcomes[ticker] = model_store.HIT
+        predicted_gains[ticker] = meta["predicted_gain"]
+        return meta["predicted_gain"]
+
+    model = xgb.XGBRegressor(**MODEL_PARAMS, n_jobs=n_jobs)
+    outcome = model_store.MISS
+    trees = MODEL_PARAMS["n_estimators"]
+    # the rows the saved booster has been trained on
+    n_trained, trained_hash = len(X_train), train_hash
+
+    extended = (meta and meta["n_train"] < len(X_train)
+                and meta["train_hash"] == _training_hash(X_train, y_train, meta["n_train"]))
+    new_rows = len(X_train) - meta["n_train"] if extended else 0
+
+    if meta and meta["train_hash"] == train_hash:
+        # same training rows, only the evaluation rows moved (e.g. the filled trailing targets)
+        print(f"Training data for {ticker} unchanged, reusing stored booster...")
+        model.load_model(store.booster_path(ticker))
+        outcome = model_store.HIT
+        trees = meta["trees"]
+    elif extended and new_rows < WARM_START_MIN_ROWS:
+        # too few new bars to boost on: keep the booster, the bars count towards the next warm start
+        print(f"Only {new_rows} new bars for {ticker}, reusing stored booster...")
+        model.load_model(store.booster_path(ticker))
+        outcome = model_store.HIT
+        trees = meta["trees"]
+        n_trained, trained_hash = meta["n_train"], meta["train_hash"]
+    elif extended and meta["trees"] + WARM_START_ROUNDS <= MAX_WARM_START_TREES:
+        # the old training rows are a prefix of the new ones: boost on the new bars only
+        print(f"Continuing XGBoost model for {ticker} on {new_rows} new bars...")
+        model.set_params(n_estimators=WARM_START_ROUNDS)
+        model.fit(X_train.iloc[meta["n_train"]:], y_train.iloc[meta["n_train"]:], xgb_model=store.booster_path(ticker))
+        outcome = model_store.WARM
+        trees = meta["trees"] + WARM_START_ROUNDS
+    else:
+        print(f"Training XGBoost model for {ticker}...")
+        model.fit(X_train, y_train)
 
-    model.fit(X_train, y_train)
     y_pred = model.predict(X_test)
 
     # Evaluate the model's performance
@@ -118,65 +295,550 @@ def train_model(df, ticker, predicted_gains):
 
     print(f"Predicted Gain for {ticker}: {predicted_gain:.2f}%")
 
+    if store:
+        store.save(ticker, model, {
+            "ticker": ticker,
+            "feature_set_version": features.FEATURE_SET_VERSION,
+            "params_hash": MODEL_PARAMS_HASH,
+            "precision": precision,
+            "data_hash": data_hash,
+            "train_hash": trained_hash,
+            "n_train": n_trained,
+            "n_rows": len(X),
+            "last_date": X.index[-1].isoformat(),
+            "trees": trees,
+            "predicted_high": predicted_high,
+            "predicted_gain": float(predicted_gain),
+            "mae": float(mae),
+            "mse": float(mse),
+            "accuracy": float(accuracy),
+        })
+    if outcomes is not None:
+        outcomes[ticker] = outcome
+
     # Store the predicted gain in the list
     predicted_gains[ticker] = predicted_gain
 
     return predicted_gain
 
 
-def update_ai_suggestions(stock_id, predicted_gain, industry_id=1):  # Default Industry_ID = 1
-    """Update AISuggestions table with stock ratings."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        cursor = conn.cursor()
+def compute_ratings(predicted_gains):
+    """Normalise every predicted gain to the 0-5 rating in one vectorised step.
 
-        # Normalize gain between 0 and 5
-        score = 5 * (gain - min_gain) / (max_gain - min_gain)
+    predicted_gains maps stock_ID to gain in percent; returns a list of (stock_ID, rating).
+    """
+    stock_ids = np.fromiter(predicted_gains.keys(), dtype=np.int64, count=len(predicted_gains))
+    gains = np.fromiter(predicted_gains.values(), dtype=np.float64, count=len(predicted_gains))
 
-        # Insert the suggestion into AISuggestions table
-        cursor.execute("""
-            INSERT INTO AISuggestions (Industry_ID, stock_ID, Rating)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (stock_ID) DO UPDATE
-            SET Rating = EXCLUDED.Rating;
-        """, (industry_id, stock_id, score))
+    # a ticker whose model produced NaN/inf keeps its previous rating
+    finite = np.isfinite(gains)
+    stock_ids, gains = stock_ids[finite], gains[finite]
+    if gains.size == 0:
+        return []
 
-        conn.commit()
-        cursor.close()
+    min_gain, max_gain = gains.min(), gains.max()
+    if max_gain > min_gain:
+        ratings = 5 * (gains - min_gain) / (max_gain - min_gain)
+    else:
+        # every gain is the same, rate them all in the middle
+        ratings = np.full(gains.shape, 2.5)
+
+    # Rating is DECIMAL(3,2)
+    ratings = np.round(ratings, 2)
+    return list(zip(stock_ids.tolist(), ratings.tolist()))
+
+
+def update_ai_suggestions(predicted_gains, industry_id=1):  # Default Industry_ID = 1
+    """Rate every scored stock and upsert all of them into AISuggestions in one transaction.
+
+    The rows are batched into a temporary staging table with execute_values and merged
+    with one INSERT ... ON CONFLICT, so readers see either the old or the new ratings,
+    never a mix. Returns the number of rows written; a database error is raised, so
+    the refresh fails instead of reporting success with nothing written.
+    """
+    ratings = compute_ratings(predicted_gains)
+    if not ratings:
+        print("No predicted gains to write to AISuggestions.")
+        return 0
+
+    conn = get_db_connection()
+    try:
+        # `with conn` commits on success and rolls back on error
+        with conn, conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE AISuggestionsStaging (
+                    stock_ID INT PRIMARY KEY,
+                    Rating DECIMAL(3,2) NOT NULL
+                ) ON COMMIT DROP;
+            """)
+            execute_values(cursor, "INSERT INTO AISuggestionsStaging (stock_ID, Rating) VALUES %s", ratings, page_size=1000)
+            cursor.execute("""
+                INSERT INTO AISuggestions (Industry_ID, stock_ID, Rating)
+                SELECT %s, stock_ID, Rating FROM AISuggestionsStaging
+                ON CONFLICT (stock_ID) DO UPDATE
+                SET Rating = EXCLUDED.Rating;
+            """, (industry_id,))
+    finally:
         conn.close()
 
-        print(f"Updated AISuggestions for stock ID {stock_id} with rating {score:.2f}.")
+    print(f"Updated AISuggestions for {len(ratings)} stocks.")
+    return len(ratings)
+
+def _timed_fetch(ticker):
+    """Fetch a ticker and return the data with the (start, end) of the download."""
+    start = time.time()
+    raw_data = fetch_stock_data(ticker)
+    return raw_data, (start, time.time())
+
+
+def _prepare_and_train(raw_data, ticker, n_jobs=None):
+    """Prepare and train a single ticker, runs inside a worker process in parallel mode.
+
+    Returns (predicted_gain, stage spans, model cache outcome).
+    """
+    start = time.time()
+    df = prepare_data(raw_data, ticker)
+    prepared = time.time()
+    outcomes = {}
+    predicted_gain = train_model(df, ticker, {}, n_jobs=n_jobs, store=get_model_store(), outcomes=outcomes)
+    return predicted_gain, {"prepare": (start, prepared), "train": (prepared, time.time())}, outcomes.get(ticker)
+
+
+def _train_prepared(df, ticker, n_jobs=None):
+    """Train a ticker whose features are already built.
 
+    Returns (predicted_gain, train spans, error, model cache outcome) so one failing
+    ticker does not end a batch of results.
+    """
+    start = time.time()
+    outcomes = {}
+    try:
+        predicted_gain = train_model(df, ticker, {}, n_jobs=n_jobs, store=get_model_store(), outcomes=outcomes)
     except Exception as e:
-        print(f"Failed to update AISuggestions for stock ID {stock_id}: {e}")
+        return None, {"train": (start, time.time())}, str(e), None
+    return predicted_gain, {"train": (start, time.time())}, None, outcomes.get(ticker)
 
-def main_ai():
-    # Fetch stock IDs and tickers from the StockPool table
-    tickers = get_stock_tickers_from_db()
-    print(tickers)
-    if not tickers:
-        print(" No tickers found in the database. Exiting.")
-        return
-    predicted_gains = {}
+
+def _run_sequential(tickers):
+    """Yield (stock_id, ticker, predicted_gain, stage spans, error, model cache outcome) one ticker at a time."""
     for stock_id, ticker in tickers:
-        print("Stock_ID", stock_id)
-        print("Ticker", ticker)
         print(f"Processing {ticker}...\n")
-        raw_data = fetch_stock_data(ticker)
-
-        if raw_data is None:
+        spans = {}
+        try:
+            raw_data, spans["fetch"] = _timed_fetch(ticker)
+            if raw_data is None:
+                yield stock_id, ticker, None, spans, "no data", None
+                continue
+
+            predicted_gain, train_spans, outcome = _prepare_and_train(raw_data, ticker)
+            spans.update(train_spans)
+            yield stock_id, ticker, predicted_gain, spans, None, outcome
+        except Exception as e:
+            yield stock_id, ticker, None, spans, str(e), None
+
+
+def _run_parallel(tickers, workers):
+    """Yield the same tuples as _run_sequential, fetching on threads and training on processes.
+
+    Training for a ticker is submitted as soon as its download finishes, so downloads and
+    XGBoost fits overlap. Each worker process gets an equal share of the cores for XGBoost.
+    """
+    n_jobs = max(1, (os.cpu_count() or 1) // workers)
+    # spawn so the training processes do not inherit the fetch threads' locks
+    mp_context = multiprocessing.get_context("spawn")
+
+    fetch_pool = ThreadPoolExecutor(max_workers=workers)
+    train_pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context)
+    try:
+        fetches = {fetch_pool.submit(_timed_fetch, ticker): (stock_id, ticker) for stock_id, ticker in tickers}
+        trains = {}
+        pending = set(fetches)
+
+        # wait on downloads and fits together so results are reported as soon as each one lands
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future in fetches:
+                    stock_id, ticker = fetches.pop(future)
+                    try:
+                        raw_data, fetch_span = future.result()
+                    except Exception as e:
+                        yield stock_id, ticker, None, {}, str(e), None
+                        continue
+
+                    if raw_data is None:
+                        yield stock_id, ticker, None, {"fetch": fetch_span}, "no data", None
+                        continue
+
+                    train_future = train_pool.submit(_prepare_and_train, raw_data, ticker, n_jobs)
+                    trains[train_future] = (stock_id, ticker, {"fetch": fetch_span})
+                    pending.add(train_future)
+                    continue
+
+                stock_id, ticker, spans = trains.pop(future)
+                try:
+                    predicted_gain, train_spans, outcome = future.result()
+                except Exception as e:
+                    yield stock_id, ticker, None, spans, str(e), None
+                    continue
+
+                spans.update(train_spans)
+                yield stock_id, ticker, predicted_gain, spans, None, outcome
+    finally:
+        # a caller that stops early (e.g. a cancelled job) should not wait for queued tickers
+        fetch_pool.shutdown(wait=True, cancel_futures=True)
+        train_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_panel(tickers, workers):
+    """Yield the same tuples as _run_sequential, building the features of all tickers in one pass.
+
+    Every ticker is fetched first (on a thread pool when workers > 1), then
+    features.build_feature_panel prepares them together and each ticker is trained from
+    its slice of the panel.
+    """
+    raw_frames = {}
+    fetch_spans = {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as fetch_pool:
+        fetched = fetch_pool.map(_timed_fetch, [ticker for _, ticker in tickers])
+        for (stock_id, ticker), (raw_data, fetch_span) in zip(tickers, fetched):
+            if raw_data is None:
+                yield stock_id, ticker, None, {"fetch": fetch_span}, "no data", None
+                continue
+            raw_frames[ticker] = raw_data
+            fetch_spans[ticker] = fetch_span
+
+    start = time.time()
+    panel = features.build_feature_panel(raw_frames)
+    prepare_span = (start, time.time())
+    del raw_frames
+
+    groups = dict(iter(panel.groupby(level="Ticker", sort=False)))
+    del panel
+
+    trained = []
+    for stock_id, ticker in tickers:
+        if ticker not in fetch_spans:
             continue
+        spans = {"fetch": fetch_spans[ticker]}
+        if prepare_span:
+            # one pass covered every ticker, so its span is counted once rather than per ticker
+            spans["prepare"], prepare_span = prepare_span, None
+        if ticker not in groups:
+            yield stock_id, ticker, None, spans, "no rows left after feature engineering", None
+            continue
+        trained.append((stock_id, ticker, spans, features.to_ticker_frame(groups.pop(ticker), ticker)))
+
+    frames = [df for _, _, _, df in trained]
+    names = [ticker for _, ticker, _, _ in trained]
+    train_pool = None
+    if workers > 1:
+        n_jobs = max(1, (os.cpu_count() or 1) // workers)
+        train_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        results = train_pool.map(_train_prepared, frames, names, [n_jobs] * len(frames))
+    else:
+        results = map(_train_prepared, frames, names)
 
-        df = prepare_data(raw_data, ticker)
-        predicted_gain = train_model(df, ticker, predicted_gains)
+    try:
+        for (stock_id, ticker, spans, _), (predicted_gain, train_spans, error, outcome) in zip(trained, results):
+            spans.update(train_spans)
+            yield stock_id, ticker, predicted_gain, spans, error, outcome
+    finally:
+        if train_pool is not None:
+            train_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_pooled(tickers, workers):
+    """Yield the same tuples as _run_sequential from one model trained over every ticker.
+
+    Every ticker is fetched (on a thread pool when workers > 1) and the features are built
+    in one pass as in _run_panel; pooled_model then fits a single booster with POOLED_THREADS
+    threads and rates the whole universe from one predict call. The prepare and train spans
+    cover every ticker, so each is counted once. The pooled booster is not stored; each rated
+    ticker's per-ticker booster is discarded instead, so /api/forecast lists it as missing
+    rather than serving a forecast from a model older than its rating.
+    """
+    # None with AI_MODEL_CACHE=0, then there are no per-ticker boosters to discard
+    store = get_model_store()
+    raw_frames = {}
+    fetch_spans = {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as fetch_pool:
+        fetched = fetch_pool.map(_timed_fetch, [ticker for _, ticker in tickers])
+        for (stock_id, ticker), (raw_data, fetch_span) in zip(tickers, fetched):
+            if raw_data is None:
+                yield stock_id, ticker, None, {"fetch": fetch_span}, "no data", None
+                continue
+            raw_frames[ticker] = raw_data
+            fetch_spans[ticker] = fetch_span
+
+    start = time.time()
+    panel = features.build_feature_panel(raw_frames)
+    prepared = time.time()
+    del raw_frames
+
+    if panel.empty:
+        gains = {}
+    else:
+        print(f"Training pooled XGBoost model on {len(panel)} rows of {len(fetch_spans)} tickers...")
+        gains = pooled_model.train_pooled(panel, get_ticker_industries())["gains"]
+    shared_spans = {"prepare": (start, prepared), "train": (prepared, time.time())}
+    del panel
 
-        # Update the AISuggestions table with the predicted rating
-        update_ai_suggestions(stock_id, predicted_gain)
+    for stock_id, ticker in tickers:
+        if ticker not in fetch_spans:
+            continue
+        spans = {"fetch": fetch_spans[ticker]}
+        if shared_spans:
+            spans.update(shared_spans)
+            shared_spans = None
+        if ticker not in gains:
+            yield stock_id, ticker, None, spans, "no rows left after feature engineering", None
+            continue
+        if store is not None:
+            store.discard(ticker)
+        print(f"Predicted Gain for {ticker}: {gains[ticker]:.2f}%")
+        yield stock_id, ticker, gains[ticker], spans, None, None
+
+
+def _fetch_downcast(ticker):
+    raw_data, span = _timed_fetch(ticker)
+    return (downcast_prices(raw_data) if raw_data is not None else None), span
+
+
+def stream_chunk_size(budget_mb, rss_mb, ticker_mb, remaining, reserve_mb=AI_STREAM_RESERVE_MB):
+    """Tickers whose bars fit in what the budget leaves after the current RSS and the working reserve."""
+    spare = budget_mb - rss_mb - reserve_mb
+    return int(min(remaining, max(1, spare // ticker_mb)))
+
+
+def _run_streaming(tickers, workers, budget_mb, memory):
+    """Yield the same tuples as _run_sequential, holding one chunk of tickers' bars at a time.
+
+    Each chunk is sized so its bars fit in the memory budget, starting from an estimate of
+    a ticker's bars and then from the largest frame actually fetched. A chunk is fetched on
+    a thread pool with prices downcast to float32, then each ticker is prepared in place,
+    trained and released before the next, and the chunk is collected before the next fetch.
+    """
+    import gc
+
+    store = get_model_store()
+    # business days in the window, each bar about 4 float32 prices, a volume, a date and a ticker reference
+    ticker_mb = np.busday_count(START_DATE, END_DATE) * 40 / memory_usage.MB
+    remaining = list(tickers)
+    chunks = 0
+
+    # a budget that only fits one ticker's bars per chunk still runs, one fetch round trip per ticker
+    rss = memory_usage.rss_mb()
+    if len(remaining) > 1 and stream_chunk_size(budget_mb, rss, ticker_mb, len(remaining)) < 2:
+        print(f"Warning: a {budget_mb:.0f} MB budget leaves no room for more than one ticker per chunk after "
+              f"{rss:.0f} MB RSS and the {AI_STREAM_RESERVE_MB:.0f} MB reserve; "
+              f"set AI_MEMORY_BUDGET_MB to at least {rss + AI_STREAM_RESERVE_MB + 2 * ticker_mb:.0f} to fetch in chunks")
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as fetch_pool:
+        while remaining:
+            size = stream_chunk_size(budget_mb, memory_usage.rss_mb(), ticker_mb, len(remaining))
+            chunk, remaining = remaining[:size], remaining[size:]
+            chunks += 1
+            print(f"Streaming chunk {chunks}: {len(chunk)} tickers at ~{ticker_mb:.2f} MB each, {len(remaining)} left")
+
+            with memory.stage("fetch"):
+                fetched = list(fetch_pool.map(_fetch_downcast, [ticker for _, ticker in chunk]))
+            for raw_data, _ in fetched:
+                if raw_data is not None:
+                    ticker_mb = max(ticker_mb, raw_data.memory_usage(deep=True).sum() / memory_usage.MB)
+
+            for i, (stock_id, ticker) in enumerate(chunk):
+                raw_data, fetch_span = fetched[i]
+                # drop the chunk's reference so the bars go as soon as this ticker is prepared
+                fetched[i] = None
+                spans = {"fetch": fetch_span}
+                if raw_data is None:
+                    yield stock_id, ticker, None, spans, "no data", None
+                    continue
+
+                try:
+                    start = time.time()
+                    with memory.stage("prepare"):
+                        df = prepare_data(raw_data, ticker, copy=False)
+                    del raw_data
+                    prepared = time.time()
+                    outcomes = {}
+                    with memory.stage("train"):
+                        predicted_gain = train_model(df, ticker, {}, store=store, outcomes=outcomes)
+                    del df
+                except Exception as e:
+                    yield stock_id, ticker, None, spans, str(e), None
+                    continue
+
+                spans.update({"prepare": (start, prepared), "train": (prepared, time.time())})
+                yield stock_id, ticker, predicted_gain, spans, None, outcomes.get(ticker)
+
+            del fetched
+            # pandas frames can hold reference cycles, return their buffers before the next fetch
+            gc.collect()
+
+
+def summarize_stages(stage_spans):
+    """Wall-clock time (first start to last end) and summed per-ticker time for each stage."""
+    summary = {}
+    for stage, spans in stage_spans.items():
+        if not spans:
+            continue
+        summary[stage] = {
+            "wall_s": max(end for _, end in spans) - min(start for start, _ in spans),
+            "busy_s": sum(end - start for start, end in spans),
+            "tickers": len(spans),
+        }
+    return summary
+
+
+def print_stage_summary(summary, total):
+    print("Stage timings (wall-clock / summed over tickers):")
+    for stage, stats in summary.items():
+        print(f"  {stage:<8} {stats['wall_s']:8.2f}s / {stats['busy_s']:8.2f}s  ({stats['tickers']} tickers)")
+    print(f"  {'total':<8} {total:8.2f}s")
+
+
+def main_ai(workers=None, progress=None, panel=None, tickers=None, baseline_gains=None, engine=None,
+            memory_budget_mb=None, trace_alloc=None):
+    """Refresh AISuggestions for every ticker in StockPool, or only the given (stock_id, ticker) pairs.
+
+    With workers > 1 the downloads run on a thread pool and training on a process pool of
+    that size; a failure in one ticker is recorded and does not stop the others.
+    progress, if given, is called as progress(stage, done, failed, total) as tickers finish;
+    an exception raised from it stops the run before anything is written.
+    With panel=True (or AI_PANEL=1) the features of all tickers are built in one pass.
+    engine="pooled" (or AI_ENGINE=pooled) trains one model over every ticker instead.
+    With memory_budget_mb (or AI_MEMORY_BUDGET_MB) the per-ticker engine streams tickers in
+    chunks that fit the budget and reports peak RSS and per-stage memory, with tracemalloc
+    allocations too when trace_alloc (or AI_TRACE_ALLOC=1) is set.
+    Ratings are relative to the whole pool, so when only some tickers are refreshed,
+    baseline_gains ({stock_id: gain}) supplies the last known gains of the others.
+    Returns a summary with the per-stage timings, the gains, per-ticker seconds and the failed tickers,
+    an empty one when there are no tickers.
+    """
+    if panel is None:
+        panel = AI_PANEL
+    if engine is None:
+        engine = AI_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {', '.join(ENGINES)}")
+    if memory_budget_mb is None:
+        memory_budget_mb = AI_MEMORY_BUDGET_MB
+    if memory_budget_mb < 0:
+        raise ValueError("memory_budget_mb must be 0 (off) or a positive number of MB")
+    if trace_alloc is None:
+        trace_alloc = AI_TRACE_ALLOC
+    if progress is None:
+        progress = lambda stage, done, failed, total: None  # noqa: E731
+    if workers is None:
+        workers = AI_WORKERS
 
+    # Fetch stock IDs and tickers from the StockPool table
+    if tickers is None:
+        tickers = get_stock_tickers_from_db()
+    print(tickers)
+    if not tickers:
+        print(" No tickers found in the database. Exiting.")
+        return {
+            "workers": workers, "stages": {}, "total_s": 0.0, "completed": 0, "written": 0,
+            "model_cache": {model_store.HIT: 0, model_store.WARM: 0, model_store.MISS: 0},
+            "gains": {}, "ticker_seconds": {}, "memory": None, "failed": {},
+        }
+
+    started = time.time()
+    stage_spans = {"fetch": [], "prepare": [], "train": [], "write": []}
+    predicted_gains = {}
+    ticker_seconds = {}
+    failed = {}
+    model_cache = {model_store.HIT: 0, model_store.WARM: 0, model_store.MISS: 0}
+    progress("processing", 0, 0, len(tickers))
+
+    memory = None
+    if engine == "pooled":
+        results = _run_pooled(tickers, workers)
+    elif memory_budget_mb:
+        memory = memory_usage.StageMemory(trace=trace_alloc)
+        results = _run_streaming(tickers, workers, memory_budget_mb, memory)
+    elif panel:
+        results = _run_panel(tickers, workers)
+    elif workers > 1:
+        results = _run_parallel(tickers, workers)
+    else:
+        results = _run_sequential(tickers)
+    try:
+        for stock_id, ticker, predicted_gain, spans, error, outcome in results:
+            for stage, span in spans.items():
+                stage_spans[stage].append(span)
+            ticker_seconds[stock_id] = sum(end - start for start, end in spans.values())
+            if outcome is not None:
+                model_cache[outcome] += 1
+
+            if error is not None:
+                print(f"Skipping {ticker} (stock ID {stock_id}): {error}")
+                failed[ticker] = error
+            else:
+                predicted_gains[stock_id] = predicted_gain
+
+            progress("processing", len(predicted_gains), len(failed), len(tickers))
+    finally:
+        results.close()
+        if memory is not None:
+            memory.close()
+
+    # ratings are relative to the whole pool, so they are written once every ticker is scored
+    progress("writing", len(predicted_gains), len(failed), len(tickers))
+    write_start = time.time()
+    written = update_ai_suggestions({**(baseline_gains or {}), **predicted_gains})
+    # every run, planned or not, records what it saw so the planner does not redo fresh tickers
+    conn = get_db_connection()
+    try:
+        refresh_planner.record_results(conn, tickers, predicted_gains, ticker_seconds, failed, get_price_store())
+    finally:
+        conn.close()
+    stage_spans["write"].append((write_start, time.time()))
+
+    total = time.time() - started
+    summary = summarize_stages(stage_spans)
+    print_stage_summary(summary, total)
+    metrics.record_refresh(stage_spans, len(predicted_gains), len(failed))
+    memory_summary = None
+    if memory is not None:
+        memory_summary = dict(memory.summary(), budget_mb=memory_budget_mb)
+        print(f"Peak RSS {memory_summary['peak_rss_mb']:.1f} MB of a {memory_budget_mb:.0f} MB budget")
+        for stage, stats in memory_summary["stages"].items():
+            allocated = f", allocated up to {stats['max_alloc_mb']:.1f} MB" if stats["max_alloc_mb"] is not None else ""
+            print(f"  {stage:<8} RSS grew up to {stats['max_rss_growth_mb']:.1f} MB{allocated}")
+    print(f"Model cache: {model_cache[model_store.HIT]} hits, {model_cache[model_store.WARM]} warm starts, "
+          f"{model_cache[model_store.MISS]} misses")
     print("All models completed and AISuggestions table updated!")
 
+    return {
+        "workers": workers,
+        "stages": summary,
+        "total_s": total,
+        "completed": len(predicted_gains),
+        "written": written,
+        "model_cache": model_cache,
+        "gains": predicted_gains,
+        "ticker_seconds": ticker_seconds,
+        "memory": memory_summary,
+        "failed": failed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the AISuggestions ratings.")
+    parser.add_argument("--workers", type=int, default=AI_WORKERS,
+                        help="tickers processed at once (default: AI_WORKERS or 1)")
+    parser.add_argument("--panel", action="store_true", default=AI_PANEL,
+                        help="build the features of all tickers in one pass (default: AI_PANEL)")
+    parser.add_argument("--engine", choices=ENGINES, default=AI_ENGINE,
+                        help="one model per ticker or one pooled model (default: AI_ENGINE)")
+    parser.add_argument("--memory-budget", type=float, default=AI_MEMORY_BUDGET_MB, metavar="MB",
+                        help="stream tickers in chunks that fit this RSS budget (default: AI_MEMORY_BUDGET_MB, 0 = off)")
+    parser.add_argument("--trace-alloc", action="store_true", default=AI_TRACE_ALLOC,
+                        help="also report per-stage allocations from tracemalloc in streaming mode")
+    args = parser.parse_args()
+    main_ai(workers=args.workers, panel=args.panel, engine=args.engine,
+            memory_budget_mb=args.memory_budget, trace_alloc=args.trace_alloc)
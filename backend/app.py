@@ -2,41 +2,91 @@ from flask import Flask, request, jsonify, make_response
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
-from flask_bcrypt import Bcrypt
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import timedelta
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, JWTManager
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, get_jwt_identity, jwt_required, JWTManager
 import re
-import StockAI
+import db
+import jobs
+import suggestions
+import price_cache
+import portfolio
+import response_cache
+import passwords
+import metrics
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-bcrypt = Bcrypt(app)
+
+# bcrypt runs on its own bounded thread pool (BCRYPT_ROUNDS, HASH_WORKERS, HASH_MAX_PENDING)
+hasher = passwords.PasswordHasher()
 
 # CORS allows the frontend
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
+# request latency and status counts per route, served at /metrics
+metrics.init_app(app)
+
 
 app.config["JWT_SECRET_KEY"] = os.getenv("SECRET_KEY",
                                          "your_secret_key")  # add in your secret key in for the encryption
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=30)  # jwt token expires in 30 minutes
+app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=int(os.getenv("JWT_REFRESH_DAYS", 7)))  # /api/refresh renews sessions without a password
 app.config["JWT_TOKEN_LOCATION"] = ["headers"]  # jwt token is in the header
 
 jwt = JWTManager(app)
 
 
-# connect to the PostgreSQL database
+# shared, bounded pool of PostgreSQL connections, sized with DB_POOL_MIN / DB_POOL_MAX / DB_POOL_TIMEOUT
+# every statement run through it is timed and labelled with the function that ran it
+db_pool = db.pool_from_env(connection_factory=metrics.timed_connection_factory())
+
+
+# check out a pooled connection, use as `with get_db_connection() as conn:`
+# the connection is returned (and rolled back if needed) on every path
 def get_db_connection():
-    return psycopg2.connect(
-        host=os.getenv('HOST'),
-        port=os.getenv('PORT'),
-        database=os.getenv('DATABASE'),
-        user=os.getenv('USER'),
-        password=os.getenv('PASSWORD')
-    )
+    return db_pool.connection()
+
+
+# ranked suggestion candidates, shared by every request in this process
+suggestion_index = suggestions.SuggestionIndex()
+
+# latest market prices, shared by every request in this process (PRICE_CACHE_TTL seconds)
+latest_prices = price_cache.PriceCache()
+
+# the AISuggestionsVersion trigger bumps it on every write to Industry, StockPool or AISuggestions
+def reference_version():
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT version FROM AISuggestionsVersion")
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+# memoised reference-data responses (industries, stock pool), served with ETag and Cache-Control
+# and rebuilt when reference_version() moves (checked every REFERENCE_VERSION_CHECK_S seconds)
+reference_cache = response_cache.ResponseCache(version=reference_version)
+
+
+# user_id and first_name are carried in the JWT claims from login(), so authenticated
+# routes do not need to look the user up by email before their real query
+def get_current_user():
+    claims = get_jwt()
+    if "user_id" in claims:
+        return {"user_id": claims["user_id"], "first_name": claims.get("first_name")}
+
+    # tokens issued before the claims were added still resolve through the email identity
+    with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT user_id, first_name FROM AccountUser WHERE email = %s", (get_jwt_identity(),))
+        return cur.fetchone()
+
+
+# answer for a login or signup turned away because too many hashes are already queued
+def hasher_busy_response():
+    response = jsonify({"error": "Too many logins in progress, try again shortly"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
 
 
 # API to responsible for the signup of users
@@ -53,32 +103,32 @@ def signup():
     if not all([first_name, last_name, email, password]):
         return jsonify({"error": "All fields are required"}), 400
 
-    # hash password because the database stores a one way encrypted password for security
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
-
     # connect to the database
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("SELECT email FROM AccountUser WHERE email = %s", (email,))
-        doesExist = cur.fetchone()
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT email FROM AccountUser WHERE email = %s", (email,))
+            doesExist = cur.fetchone()
 
         # cannot have an account with the same email address
         if doesExist:
             return jsonify({"error": "An account already exists with that email"}), 400
 
-        cur.execute(
-            "INSERT INTO AccountUser (first_name, last_name, email, password) VALUES (%s, %s, %s, %s) RETURNING id",
-            (first_name, last_name, email, hashed_password)
-        )
-        user_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
+        # hash password because the database stores a one way encrypted password for security
+        # the hash is computed with no pooled connection checked out
+        hashed_password = hasher.hash(password)
+
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO AccountUser (first_name, last_name, email, password) VALUES (%s, %s, %s, %s) RETURNING user_ID",
+                (first_name, last_name, email, hashed_password)
+            )
+            user_id = cur.fetchone()[0]
+            conn.commit()
 
         return jsonify({"message": "User registered successfully", "user_id": user_id}), 201
 
+    except passwords.HasherBusy:
+        return hasher_busy_response()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -91,33 +141,64 @@ def login():
         email = data.get('email')
         password = data.get('password')
 
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Check if email exists
-        cur.execute("SELECT user_ID, password FROM AccountUser WHERE email = %s", (email,))
-        user = cur.fetchone()
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Check if email exists
+            cur.execute("SELECT user_ID, first_name, password FROM AccountUser WHERE email = %s", (email,))
+            user = cur.fetchone()
 
         if not user:
             return jsonify({"message": "Invalid credentials"}), 401
 
-        print(f"User found: {user}")
-
         # Validate password
-        if not bcrypt.check_password_hash(user["password"], password):
+        if not hasher.check(user["password"], password):
             print("Password does not match")
             return jsonify({"message": "Invalid credentials"}), 401
 
-        # Generate JWT token
-        token = create_access_token(identity=email)
+        # hashes made with an older work factor are upgraded after the response, on the hash pool
+        if hasher.needs_rehash(user["password"]):
+            hasher.rehash_in_background(password, lambda new_hash: store_rehashed_password(user["user_id"], user["password"], new_hash))
+
+        # Generate JWT tokens, carrying the user's id and name so later requests skip the lookup
+        claims = {"user_id": user["user_id"], "first_name": user["first_name"]}
+        token = create_access_token(identity=email, additional_claims=claims)
+        refresh_token = create_refresh_token(identity=email, additional_claims=claims)
         print("Login successful, token generated")
 
-        return jsonify({"token": token}), 200
+        return jsonify({"token": token, "refresh_token": refresh_token}), 200
 
+    except passwords.HasherBusy:
+        return hasher_busy_response()
     except Exception as e:
         print("Error:", str(e))  # Print the actual error to Flask logs
         return jsonify({"error": str(e)}), 500
 
+# only replaces the hash it was computed from, so a password changed meanwhile is kept
+def store_rehashed_password(user_id, old_hash, new_hash):
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE AccountUser SET password = %s WHERE user_ID = %s AND password = %s", (new_hash, user_id, old_hash))
+        conn.commit()
+
+
+# new access token from a refresh token, no password and no bcrypt
+@app.route('/api/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({"message": "User not found"}), 401
+
+        token = create_access_token(
+            identity=get_jwt_identity(),
+            additional_claims={"user_id": user["user_id"], "first_name": user["first_name"]}
+        )
+        return jsonify({"token": token}), 200
+
+    except Exception as e:
+        print("Error in /api/refresh:", str(e))
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/', methods=["GET"])
 def index():
     return jsonify({"status":"ok"}), 200
@@ -126,27 +207,15 @@ def index():
 @app.route("/api/dashboard", methods=["GET"])
 @jwt_required()
 def get_dashboard():
-    # gets the identity of the user from jwt
-    user_email = get_jwt_identity()
-
-    # connect to database
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        # query to get info from the db
-        cur.execute("SELECT user_id, first_name FROM AccountUser WHERE email = %s", (user_email,))
-        user = cur.fetchone()
+        # gets the identity of the user from jwt
+        user = get_current_user()
 
         if not user:
-            cur.close()
-            conn.close()
             return jsonify({"message": "User not found"}), 404
 
         first_name = user["first_name"]
 
-        cur.close()
-        conn.close()
-
         return jsonify({
             "first_name": first_name
         }), 200
@@ -156,142 +225,291 @@ def get_dashboard():
 
 
 # portfolio API requires JWT Auth
+# ?limit=N&after=<entry_ID> pages by entry_ID, ?stream=1 streams the lots off a server-side cursor,
+# and If-None-Match with the last ETag gets a 304 while the portfolio is unchanged
 @app.route("/api/portfolio", methods=["GET"])
 @jwt_required()
 def get_portfolio():
-    # Get the user's email from JWT
-    user_email = get_jwt_identity()
+    try:
+        error, after, limit = portfolio.page_params(request.args)
+        if error:
+            return jsonify({"error": error}), 400
+        stream = request.args.get("stream") in ("1", "true")
+
+        # Get the user from JWT
+        user = get_current_user()
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+
+        user_id = user["user_id"]
+
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # the version is read before the lots, so a tag is never newer than the rows sent with it
+            tag = portfolio.etag(user_id, portfolio.get_version(cur, user_id), after, limit, stream)
+            if request.if_none_match.contains(tag):
+                response = make_response("", 304)
+                response.set_etag(tag)
+                return response
+
+            if not stream:
+                stocks, next_after = portfolio.fetch_page(cur, user_id, after, limit)
+
+        if stream:
+            response = app.response_class(_stream_portfolio(user_id, after, limit), mimetype="application/json")
+        else:
+            response = jsonify({
+                'portfolio': stocks,
+                'next_after': next_after,
+                'status': 'success'
+            })
+        response.set_etag(tag)
+        # browsers keep the copy but revalidate it every time
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    except Exception as e:
+        print(f"🔥 Error in /api/portfolio: {str(e)}")  # Log error
+        return jsonify({"error": str(e)}), 500
+
 
+# the body of a streamed /api/portfolio, the pooled connection is held until the last lot is sent
+def _stream_portfolio(user_id, after, limit):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with get_db_connection() as conn:
+            yield '{"portfolio": ['
+            for i, lot in enumerate(portfolio.stream_lots(conn, user_id, after, limit)):
+                yield ("," if i else "") + app.json.dumps(lot)
+            yield '], "status": "success"}'
+    except Exception as e:
+        # the status line is already sent, the client sees a truncated body
+        print(f"🔥 Error streaming /api/portfolio: {str(e)}")
+        raise
 
-        # Check if user exists
-        cur.execute("SELECT user_ID FROM AccountUser WHERE email = %s", (user_email,))
-        user = cur.fetchone()
+
+# market value, unrealised P&L and industry weights of the user's lots at the latest prices
+@app.route("/api/portfolio/valuation", methods=["GET"])
+@jwt_required()
+def get_portfolio_valuation():
+    try:
+        user = get_current_user()
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        user_id = user[0]  # Extract the user_ID
+        with get_db_connection() as conn, conn.cursor() as cur:
+            lots, _ = portfolio.fetch_page(cur, user["user_id"])
 
-        # Get stock entries for this user
-        cur.execute("SELECT s.entry_ID, s.stock, i.name, s.number, s.price_per_share, s.date FROM StockEntry s INNER JOIN Industry i ON s.industry_ID = i.industry_ID WHERE user_ID = %s ORDER BY entry_ID", (user_id,))
-        columns = ["entry_ID", "stock", "name", "number", "price_per_share", "date"]
-        stocks = [dict(zip(columns, row)) for row in cur.fetchall()]
-        cur.close()
-        conn.close()
-        print(stocks)
-        return jsonify({
-            'portfolio': stocks,
-            'status': 'success'
-        })
+        # one batched fetch for whatever symbols are not already cached
+        prices = latest_prices.get_many(lot["stock"] for lot in lots)
+        # imported here so numpy is only loaded by workers that value a portfolio,
+        # the web process otherwise imports nothing beyond Flask, psycopg2 and the auth libraries
+        import valuation
+        result = valuation.value_portfolio(lots, prices)
+        result["status"] = "success"
+        return jsonify(result), 200
 
     except Exception as e:
-        print(f"🔥 Error in /api/portfolio: {str(e)}")  # Log error
+        print(f"Error in /api/portfolio/valuation: {str(e)}")
         return jsonify({"error": str(e)}), 500
+
+
+# predicted highs and gains 1-5 trading days ahead from the stored models,
+# e.g. /api/forecast?tickers=AAPL,MSFT&horizons=1,5
+@app.route("/api/forecast", methods=["GET"])
+@jwt_required()
+def get_forecast():
+    try:
+        # imported here so only workers that serve forecasts load numpy and xgboost
+        import forecast
+
+        tickers = [ticker.strip().upper() for ticker in request.args.get("tickers", "").split(",") if ticker.strip()]
+        if not tickers or len(tickers) > forecast.FORECAST_MAX_TICKERS:
+            return jsonify({"error": f"tickers must list 1 to {forecast.FORECAST_MAX_TICKERS} symbols"}), 400
+
+        try:
+            horizons = [int(h) for h in request.args.get("horizons", "").split(",") if h.strip()]
+        except ValueError:
+            return jsonify({"error": "horizons must be a comma-separated list of whole days"}), 400
+        if any(not 1 <= h <= forecast.FORECAST_MAX_HORIZON for h in horizons):
+            return jsonify({"error": f"horizons must be between 1 and {forecast.FORECAST_MAX_HORIZON} days"}), 400
+
+        result = forecast.get_registry().forecast(tickers, horizons)
+        result["status"] = "success"
+        return jsonify(result), 200
+
+    except Exception as e:
+        print(f"Error in /api/forecast: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+# field, points, start, end and format of a price-series request, ValueError if any is invalid
+def price_series_params(price_series):
+    field = request.args.get("field", "close")
+    if field not in price_series.FIELDS:
+        raise ValueError(f"field must be one of {', '.join(price_series.FIELDS)}")
+    fmt = request.args.get("format", "json")
+    if fmt not in price_series.FORMATS:
+        raise ValueError(f"format must be one of {', '.join(price_series.FORMATS)}")
+
+    try:
+        points = int(request.args.get("points", price_series.PRICE_SERIES_DEFAULT_POINTS))
+    except ValueError:
+        raise ValueError("points must be an integer") from None
+    if not 3 <= points <= price_series.PRICE_SERIES_MAX_POINTS:
+        raise ValueError(f"points must be between 3 and {price_series.PRICE_SERIES_MAX_POINTS}")
+
+    start, end = request.args.get("start"), request.args.get("end")
+    for value in (start, end):
+        if value:
+            price_series.to_day(value)
+    return field, points, start, end, fmt
+
+
+# a price-series response with its ETag and Cache-Control, a 304 with no body when body is None
+def price_series_response(body, tag, max_age, mimetype=None):
+    response = make_response(body if body is not None else ("", 304))
+    if mimetype:
+        response.mimetype = mimetype
+    response.set_etag(tag)
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return response
+
+
+# daily bars of one ticker downsampled for charts, e.g. /api/prices/AAPL?points=60&start=2023-01-01
+# format=json (rows), columns (parallel arrays) or binary (see price_series.as_binary)
+@app.route("/api/prices/<ticker>", methods=["GET"])
+def get_price_series(ticker):
+    try:
+        # imported here so only workers that draw charts load numpy and pandas
+        import price_series
+
+        ticker = ticker.upper()
+        if not price_series.is_symbol(ticker):
+            return jsonify({"error": "Invalid stock ticker symbol"}), 400
+        try:
+            field, points, start, end, fmt = price_series_params(price_series)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        store = price_series.get_store()
+        version = store.version(ticker)
+        if version is None:
+            return jsonify({"error": f"No prices stored for {ticker}"}), 404
+
+        tag = price_series.etag(version, ticker, field, points, start, end, fmt)
+        if request.if_none_match.contains(tag):
+            return price_series_response(None, tag, price_series.PRICE_SERIES_MAX_AGE)
+
+        days, values = store.series(ticker, version, field, points, start, end)
+        if fmt == "binary":
+            return price_series_response(price_series.as_binary(days, values), tag, price_series.PRICE_SERIES_MAX_AGE,
+                                         "application/octet-stream")
+
+        body = {"ticker": ticker, "field": field, "points": len(days)}
+        if fmt == "columns":
+            body.update(price_series.as_columns(days, values))
+        else:
+            body["series"] = price_series.as_rows(days, values)
+        return price_series_response(jsonify(body), tag, price_series.PRICE_SERIES_MAX_AGE)
+
+    except Exception as e:
+        print(f"Error in /api/prices: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+# the same series for several tickers in one response, e.g. every sparkline of the portfolio page:
+# /api/prices?tickers=AAPL,MSFT&points=30&format=columns
+@app.route("/api/prices", methods=["GET"])
+def get_price_series_many():
+    try:
+        import price_series
+
+        tickers = list(dict.fromkeys(t.strip().upper() for t in request.args.get("tickers", "").split(",") if t.strip()))
+        if not tickers or len(tickers) > price_series.PRICE_SERIES_MAX_TICKERS:
+            return jsonify({"error": f"tickers must list 1 to {price_series.PRICE_SERIES_MAX_TICKERS} symbols"}), 400
+        if not all(price_series.is_symbol(ticker) for ticker in tickers):
+            return jsonify({"error": "Invalid stock ticker symbol"}), 400
+        try:
+            field, points, start, end, fmt = price_series_params(price_series)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if fmt == "binary":
+            return jsonify({"error": "format=binary is only available for a single ticker"}), 400
+
+        store = price_series.get_store()
+        versions = {ticker: store.version(ticker) for ticker in tickers}
+        tag = price_series.etag(sorted(versions.items()), field, points, start, end, fmt)
+        if request.if_none_match.contains(tag):
+            return price_series_response(None, tag, price_series.PRICE_SERIES_MAX_AGE)
+
+        series = {}
+        for ticker, version in versions.items():
+            if version is None:
+                continue
+            days, values = store.series(ticker, version, field, points, start, end)
+            series[ticker] = price_series.as_columns(days, values) if fmt == "columns" else price_series.as_rows(days, values)
+
+        body = {"field": field, "series": series, "missing": [t for t, v in versions.items() if v is None]}
+        return price_series_response(jsonify(body), tag, price_series.PRICE_SERIES_MAX_AGE)
+
+    except Exception as e:
+        print(f"Error in /api/prices: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/api/suggestions", methods=["GET"])
 @jwt_required()
 def get_suggestions():
-    user_email = get_jwt_identity()
-    
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
         # Get user ID
-        cur.execute("SELECT user_id FROM AccountUser WHERE email = %s", (user_email,))
-        user = cur.fetchone()
+        user = get_current_user()
         if not user:
             return jsonify({"error": "User not found"}), 404
         user_id = user['user_id']
 
-        # Get all industries with minimum count
-        cur.execute("""
-            WITH industry_counts AS (
-                SELECT i.industry_id, COUNT(*)::INT
-                FROM StockEntry s
-                JOIN Industry i ON s.industry_id = i.industry_id
-                WHERE user_id = %s
-                GROUP BY i.industry_id
-            )
-            SELECT industry_id
-            FROM industry_counts
-            WHERE count = (SELECT MIN(count) FROM industry_counts)
-        """, (user_id,))
-        
-        min_industries = [row['industry_id'] for row in cur.fetchall()]
-
-        # Get suggestions from all minimum industries
-        cur.execute("""
-            SELECT sp.ticker_symbol AS ticker,
-                   sp.name AS name,
-                   i.name AS industry,
-                   ai.rating AS rating
-            FROM AISuggestions ai
-            JOIN StockPool sp ON ai.stock_id = sp.stock_id
-            JOIN Industry i ON ai.industry_id = i.industry_id
-            WHERE ai.industry_id = ANY(%s)
-            AND sp.ticker_symbol NOT IN (
-                SELECT stock FROM StockEntry WHERE user_id = %s
-            )
-            ORDER BY ai.rating DESC
-            LIMIT 3
-        """, (min_industries, user_id))
-        
-        suggestions = cur.fetchall()
-
-        # If less than 3 suggestions, fill with other industries
-        if len(suggestions) < 3:
-            cur.execute("""
-                SELECT sp.ticker_symbol AS ticker,
-                       sp.name AS name,
-                       i.name AS industry,
-                       ai.rating AS rating
-                FROM AISuggestions ai
-                JOIN StockPool sp ON ai.stock_id = sp.stock_id
-                JOIN Industry i ON ai.industry_id = i.industry_id
-                WHERE sp.ticker_symbol NOT IN (
-                    SELECT stock FROM StockEntry WHERE user_id = %s
-                )
-                ORDER BY ai.rating DESC
-                LIMIT %s
-            """, (user_id, 3 - len(suggestions)))
-            suggestions += cur.fetchall()
+        # candidates are ranked in memory and rebuilt whenever the ratings change,
+        # so this is one query for the user's holdings plus an in-process merge
+        with get_db_connection() as conn:
+            ranked = suggestion_index.suggest(conn, user_id)
 
         # Convert ratings
-        for suggestion in suggestions:
-            rating = suggestion['rating']
-            suggestion['confidence'] = int((rating / 5) * 100)
-            suggestion['rating'] = "Strong Buy" if rating >= 4.5 else "Buy" if rating >= 4.0 else "Hold"
-
-        return jsonify({'suggestions': suggestions[:3]}), 200
+        return jsonify({'suggestions': suggestions.with_labels(ranked)[:3]}), 200
 
     except Exception as e:
         print(f"Error: {str(e)}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+
+
+# Industry only changes through migrations, so the response is built once per data version
 @app.route("/api/industries", methods=["GET"])
+@reference_cache.cached()
 def get_industries():
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("SELECT * from Industry;")
-    industries = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT * from Industry;")
+        industries = cur.fetchall()
 
     return jsonify({
             'industries': industries,
             'status': 'success'
         })
 
+
+# tickers the AI rates, read-mostly like the industries
+@app.route("/api/stockpool", methods=["GET"])
+@reference_cache.cached()
+def get_stock_pool():
+    with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT stock_ID, ticker_symbol, name FROM StockPool ORDER BY ticker_symbol")
+        stocks = cur.fetchall()
+
+    return jsonify({
+            'stocks': stocks,
+            'status': 'success'
+        })
+
 @app.route('/api/addstock', methods=['POST'])
 @jwt_required()
 def add_stock():
     data = request.get_json()
-    user_email = get_jwt_identity()
     symbol = data['stock']
     industry = data['industry_id']
     try:
@@ -319,66 +537,96 @@ def add_stock():
         return jsonify({"error": "Number must be a positive integer"}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("SELECT user_ID FROM AccountUser WHERE email = %s", (user_email,))
-        doesExist = cur.fetchone()
-        print(doesExist[0])
-        # cannot have an account with the same email address
-        if not doesExist:
+        user = get_current_user()
+        if not user:
             return jsonify({"error": "An error occured"}), 400
 
-        cur.execute(
-            "INSERT INTO StockEntry (user_ID, Industry_ID, stock, number, date, price_per_share) VALUES (%s, %s, %s, %s, %s, %s) RETURNING entry_ID",
-            (doesExist[0], industry, symbol, number, date, price_per_share)
-        )
-        stock_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO StockEntry (user_ID, Industry_ID, stock, number, date, price_per_share) VALUES (%s, %s, %s, %s, %s, %s) RETURNING entry_ID",
+                (user["user_id"], industry, symbol, number, date, price_per_share)
+            )
+            stock_id = cur.fetchone()[0]
+            conn.commit()
 
         return jsonify({"message": "User registered successfully", "stock_id": stock_id}), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+
+# many lots at once: a CSV (upload field "file" or the raw body) or a JSON array, with the same
+# fields and rules as /api/addstock. Valid rows are inserted in one transaction, invalid
+# ones come back with their row number and errors
+@app.route("/api/portfolio/import", methods=["POST"])
+@jwt_required()
+def import_stocks():
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+
+        upload = request.files.get("file")
+        if upload:
+            body = upload.read()
+            content_type = "application/json" if (upload.filename or "").lower().endswith(".json") else upload.mimetype
+        else:
+            body = request.get_data()
+            content_type = request.mimetype or ""
+
+        # imported here so pandas is only loaded by workers that run an import
+        import trade_import
+
+        try:
+            trades = trade_import.parse_trades(body, content_type)
+        except trade_import.InvalidUpload as e:
+            return jsonify({"error": str(e)}), 400
+
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT industry_ID FROM Industry")
+                industry_ids = {row[0] for row in cur.fetchall()}
+
+            valid, errors = trade_import.validate_trades(trades, industry_ids)
+            inserted = 0
+            if len(valid):
+                inserted = trade_import.load_trades(conn, user["user_id"], valid)
+                conn.commit()
+
+        return jsonify({
+            "inserted": inserted,
+            "rejected": len(errors),
+            "errors": errors,
+            "status": "success" if inserted else "error"
+        }), 201 if inserted else 400
+
+    except Exception as e:
+        print(f"🔥 Error importing stocks: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 
 @app.route("/api/portfolio/<int:entry_id>", methods=["DELETE"])
 @jwt_required()
 def delete_stock(entry_id):
-    user_email = get_jwt_identity()
-
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
         # Check if user exists
-        cur.execute("SELECT user_ID FROM AccountUser WHERE email = %s", (user_email,))
-        user = cur.fetchone()
+        user = get_current_user()
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        user_id = user[0]  # Extract the user_ID
-        
-        cur.execute("SELECT entry_ID FROM StockEntry WHERE entry_ID = %s AND user_ID = %s", (entry_id, user_id))
-        stock_entry = cur.fetchone()
+        user_id = user["user_id"]
 
-        if not stock_entry:
-            return jsonify({"error": "Stock not found"}), 404
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # the ownership check and the delete are one statement
+            cur.execute(
+                "DELETE FROM StockEntry WHERE entry_ID = %s AND user_ID = %s RETURNING entry_ID",
+                (entry_id, user_id)
+            )
+            stock_entry = cur.fetchone()
 
-        cur.execute(
-            "DELETE FROM StockEntry WHERE entry_ID = %s AND user_ID = %s",
-            (entry_id, user_id)
-        )
+            if not stock_entry:
+                return jsonify({"error": "Stock not found"}), 404
 
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
 
         return jsonify({"message": "User deleted stock successfully", "entry_id": entry_id}), 200
 
@@ -391,7 +639,6 @@ def delete_stock(entry_id):
 @jwt_required()
 def update_stock(entry_id):
     data = request.get_json()
-    user_email = get_jwt_identity()
     symbol = data['stock']
     industry = data['name']
     try:
@@ -402,31 +649,25 @@ def update_stock(entry_id):
     price_per_share = data['price_per_share']
     date = data['date']
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
         # Check if user exists
-        cur.execute("SELECT user_ID FROM AccountUser WHERE email = %s", (user_email,))
-        user = cur.fetchone()
+        user = get_current_user()
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        user_id = user[0]  # Extract the user_ID
-        
-        cur.execute("SELECT entry_ID FROM StockEntry WHERE entry_ID = %s AND user_ID = %s", (entry_id, user_id))
-        stock_entry = cur.fetchone()
+        user_id = user["user_id"]
 
-        if not stock_entry:
-            return jsonify({"error": "Stock not found"}), 404
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # the ownership check and the update are one statement
+            cur.execute(
+                "UPDATE StockEntry SET entry_ID = %s, industry_id = %s, stock = %s, number = %s, price_per_share = %s, date = %s WHERE entry_ID = %s AND user_ID = %s RETURNING entry_ID",
+                (entry_id, industry, symbol, number, price_per_share, date, entry_id, user_id)
+            )
+            stock_entry = cur.fetchone()
 
-        cur.execute(
-            "UPDATE StockEntry SET entry_ID = %s, industry_id = %s, stock = %s, number = %s, price_per_share = %s, date = %s WHERE entry_ID = %s AND user_ID = %s",
-            (entry_id, industry, symbol, number, price_per_share, date, entry_id, user_id)
-        )
+            if not stock_entry:
+                return jsonify({"error": "Stock not found"}), 404
 
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
 
         return jsonify({"message": "Stock updated successfully", "entry_id": entry_id}), 200
 
@@ -436,14 +677,98 @@ def update_stock(entry_id):
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/stock_ai', methods=['GET'])
+# connection pool counters, used to size DB_POOL_MAX
+@app.route('/api/pool', methods=['GET'])
+def pool_stats():
+    return jsonify(db_pool.stats()), 200
+
+
+# password hashing queue depth, wait and hash times, rejected logins
+@app.route('/api/hasher', methods=['GET'])
+def hasher_stats():
+    return jsonify(hasher.stats()), 200
+
+
+# Prometheus scrape endpoint: route and query latency histograms, AI refresh stage timings
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    body, content_type = metrics.exposition()
+    return app.response_class(body, content_type=content_type)
+
+
+# hit counters of the in-process price and reference-data caches
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    return jsonify({"prices": latest_prices.stats(), "reference": reference_cache.stats()}), 200
+
+
+# queue a refresh of the AI ratings, the work runs in a separate worker process
+# ?budget=<seconds> refreshes only the stale tickers that fit in that time
+# POST only, so a link prefetch or a crawler never starts a refresh
+@app.route('/stock_ai', methods=['POST'])
 def stock_ai():
     try:
-        # Call the main_ai function from the StockAI module
-        StockAI.main_ai()
-        return jsonify({"message": "AI model executed successfully"}), 200
+        budget_s = request.args.get("budget", type=float)
+        if budget_s is not None and budget_s <= 0:
+            return jsonify({"error": "budget must be a positive number of seconds"}), 400
+
+        with get_db_connection() as conn:
+            job_id = jobs.enqueue_refresh(conn, budget_s=budget_s)
+            if job_id is None:
+                active_job = jobs.get_active_job(conn)
+                return jsonify({"error": "An AI refresh is already running", "job_id": active_job}), 409
+
+        return jsonify({"message": "AI refresh queued", "job_id": job_id}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# the queued or running refresh, if any, read-only
+@app.route('/stock_ai/active', methods=['GET'])
+def stock_ai_active():
+    try:
+        with get_db_connection() as conn:
+            job_id = jobs.get_active_job(conn)
+            job = jobs.get_job(conn, job_id) if job_id is not None else None
+
+        if not job:
+            return jsonify({"error": "No AI refresh is queued or running"}), 404
+
+        return jsonify(job), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# progress of an AI refresh: tickers done and failed, current stage, elapsed time and ETA
+@app.route('/stock_ai/<int:job_id>', methods=['GET'])
+def stock_ai_status(job_id):
+    try:
+        with get_db_connection() as conn:
+            job = jobs.get_job(conn, job_id)
+
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+
+        return jsonify(job), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/stock_ai/<int:job_id>/cancel', methods=['POST'])
+def stock_ai_cancel(job_id):
+    try:
+        with get_db_connection() as conn:
+            cancelled = jobs.request_cancel(conn, job_id)
+
+        if not cancelled:
+            return jsonify({"error": "Job not found or already finished"}), 404
+
+        return jsonify({"message": "Cancellation requested", "job_id": job_id}), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# development server only, set FLASK_DEBUG=1 for the reloader and debugger
+# in production run the pre-forked server instead: gunicorn -c gunicorn.conf.py app:app
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", debug=True)
+    metrics.reset()
+    app.run(host="0.0.0.0", debug=os.getenv("FLASK_DEBUG") == "1")
@@ -0,0 +1,226 @@
+"""Async serving mode for the read-only routes: dashboard, portfolio, suggestions and industries.
+
+Same URLs, JWT semantics and JSON shapes as app.py, on Starlette and asyncpg, so a few
+processes can hold thousands of open connections. Writes, logins and everything else stay
+on the Flask app; route the four GET paths here at the proxy. Run with:
+    uvicorn async_app:app --host 0.0.0.0 --port 5001 --workers 4
+"""
+import hashlib
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+from decimal import Decimal
+
+import asyncpg
+import jwt
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Route
+from werkzeug.http import http_date
+
+import db
+import portfolio
+import response_cache
+import suggestions
+
+load_dotenv()
+
+# the same secret app.py signs its tokens with
+JWT_SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key")
+# asyncpg pool per process, connections are cheap to hold idle while requests wait on I/O
+ASYNC_DB_POOL_MIN = int(os.getenv('ASYNC_DB_POOL_MIN', 2))
+ASYNC_DB_POOL_MAX = int(os.getenv('ASYNC_DB_POOL_MAX', 20))
+
+PORTFOLIO_VERSION_QUERY = "SELECT version FROM PortfolioVersion WHERE user_ID = $1"
+LOTS_QUERY = """
+    SELECT s.entry_ID, s.stock, i.name, s.number, s.price_per_share, s.date
+    FROM StockEntry s
+    INNER JOIN Industry i ON s.industry_ID = i.industry_ID
+    WHERE s.user_ID = $1 AND s.entry_ID > $2
+    ORDER BY s.entry_ID
+"""
+
+suggestion_index = suggestions.SuggestionIndex()
+# (body, etag, stored_at) of /api/industries
+industries_cache = {}
+
+
+def _default(value):
+    # what Flask's JSON provider does with the same types
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_response(data, status=200, headers=None):
+    body = json.dumps(data, default=_default, sort_keys=True, separators=(",", ":"))
+    return Response(body, status_code=status, media_type="application/json", headers=headers)
+
+
+def jwt_error(message, status):
+    return json_response({"msg": message}, status)
+
+
+def current_claims(request):
+    """Claims of the request's access token, or an error response as flask_jwt_extended would send it."""
+    header = request.headers.get("Authorization", "")
+    if not header:
+        return None, jwt_error("Missing Authorization Header", 401)
+    parts = header.split()
+    if len(parts) != 2 or parts[0] != "Bearer":
+        return None, jwt_error("Bad Authorization header. Expected 'Authorization: Bearer <JWT>'", 422)
+    try:
+        claims = jwt.decode(parts[1], JWT_SECRET_KEY, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        return None, jwt_error("Token has expired", 401)
+    except jwt.InvalidTokenError as e:
+        return None, jwt_error(str(e), 422)
+    if claims.get("type") != "access":
+        return None, jwt_error("Only non-refresh tokens are allowed", 422)
+    return claims, None
+
+
+async def get_current_user(conn, claims):
+    if "user_id" in claims:
+        return {"user_id": claims["user_id"], "first_name": claims.get("first_name")}
+
+    # tokens issued before the claims were added still resolve through the email identity
+    row = await conn.fetchrow("SELECT user_id, first_name FROM AccountUser WHERE email = $1", claims["sub"])
+    return dict(row) if row else None
+
+
+async def get_dashboard(request):
+    claims, error = current_claims(request)
+    if error:
+        return error
+    try:
+        async with request.app.state.pool.acquire() as conn:
+            user = await get_current_user(conn, claims)
+        if not user:
+            return json_response({"message": "User not found"}, 404)
+        return json_response({"first_name": user["first_name"]})
+    except Exception as e:
+        print("Error in /api/dashboard:", str(e))
+        return json_response({"error": str(e)}, 500)
+
+
+async def get_portfolio(request):
+    claims, error = current_claims(request)
+    if error:
+        return error
+    try:
+        error, after, limit = portfolio.page_params(request.query_params)
+        if error:
+            return json_response({"error": error}, 400)
+
+        async with request.app.state.pool.acquire() as conn:
+            user = await get_current_user(conn, claims)
+            if not user:
+                return json_response({"error": "User not found"}, 404)
+            user_id = user["user_id"]
+
+            # same tag as the sync app (stream=False), so either server can answer a revalidation
+            version = await conn.fetchval(PORTFOLIO_VERSION_QUERY, user_id) or 0
+            tag = portfolio.etag(user_id, version, after, limit, False)
+            if f'"{tag}"' in request.headers.get("If-None-Match", ""):
+                return Response(status_code=304, headers={"ETag": f'"{tag}"'})
+
+            if limit is None:
+                rows = await conn.fetch(LOTS_QUERY, user_id, after)
+            else:
+                rows = await conn.fetch(LOTS_QUERY + " LIMIT $3", user_id, after, limit + 1)
+
+        stocks = [dict(zip(portfolio.COLUMNS, row)) for row in rows]
+        next_after = None
+        if limit is not None and len(stocks) > limit:
+            stocks = stocks[:limit]
+            next_after = stocks[-1]["entry_ID"]
+
+        return json_response(
+            {'portfolio': stocks, 'next_after': next_after, 'status': 'success'},
+            headers={"ETag": f'"{tag}"', "Cache-Control": "private, no-cache"}
+        )
+    except Exception as e:
+        print(f"🔥 Error in /api/portfolio: {str(e)}")
+        return json_response({"error": str(e)}, 500)
+
+
+async def get_suggestions(request):
+    claims, error = current_claims(request)
+    if error:
+        return error
+    try:
+        async with request.app.state.pool.acquire() as conn:
+            user = await get_current_user(conn, claims)
+            if not user:
+                return json_response({"error": "User not found"}, 404)
+
+            holdings = await conn.fetch(suggestions.HOLDINGS_QUERY.replace("%s", "$1"), user["user_id"])
+            version = holdings[0][0] if holdings else None
+            # one event loop per process, so no lock: a second rebuild at most repeats the work
+            if not suggestion_index.is_current(version):
+                rows = await conn.fetch(suggestions.RATINGS_QUERY)
+                suggestion_index.load([dict(row) for row in rows], version)
+
+        ranked = suggestion_index.pick([tuple(row) for row in holdings])
+        return json_response({'suggestions': suggestions.with_labels(ranked)[:3]})
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return json_response({"error": str(e)}, 500)
+
+
+async def get_industries(request):
+    try:
+        entry = industries_cache.get("industries")
+        if entry is None or time.monotonic() - entry[2] >= response_cache.REFERENCE_CACHE_TTL:
+            async with request.app.state.pool.acquire() as conn:
+                rows = await conn.fetch("SELECT * from Industry;")
+            body = json.dumps({'industries': [list(row) for row in rows], 'status': 'success'},
+                              default=_default, sort_keys=True, separators=(",", ":")).encode()
+            entry = (body, hashlib.sha1(body).hexdigest(), time.monotonic())
+            industries_cache["industries"] = entry
+
+        body, etag, _ = entry
+        headers = {"ETag": f'"{etag}"', "Cache-Control": f"public, max-age={response_cache.REFERENCE_MAX_AGE}"}
+        if f'"{etag}"' in request.headers.get("If-None-Match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+    except Exception as e:
+        return json_response({"error": str(e)}, 500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    kwargs = db.connect_kwargs_from_env()
+    app.state.pool = await asyncpg.create_pool(
+        host=kwargs["host"],
+        port=int(kwargs["port"]) if kwargs["port"] else None,
+        database=kwargs["database"],
+        user=kwargs["user"],
+        password=kwargs["password"],
+        min_size=ASYNC_DB_POOL_MIN,
+        max_size=ASYNC_DB_POOL_MAX,
+    )
+    try:
+        yield
+    finally:
+        await app.state.pool.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/dashboard", get_dashboard, methods=["GET"]),
+        Route("/api/portfolio", get_portfolio, methods=["GET"]),
+        Route("/api/suggestions", get_suggestions, methods=["GET"]),
+        Route("/api/industries", get_industries, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
+# CORS allows the frontend
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"], allow_credentials=True)
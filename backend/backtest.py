@@ -0,0 +1,219 @@
+"""Walk-forward backtest of the gain predictor across the StockPool.
+
+Each ticker's rows are split into consecutive folds: train on everything before a test
+window (or only the last --train-window rows), predict the window, move forward by one
+window. The target looks TARGET_HORIZON rows ahead, so the last TARGET_HORIZON training rows
+before each window are purged (their labels fall inside it) and the last TARGET_HORIZON rows
+of the ticker are never scored (their labels are forward-filled, not real highs). Tickers run on a process pool. The prepared features are cached per ticker in
+BACKTEST_CACHE_DIR and reused while the ticker's bars are unchanged, so comparing model
+settings only pays for the fits:
+    python backtest.py --workers 8 --json base.json
+    python backtest.py --workers 8 --param max_depth=5 --param n_estimators=200 --json deeper.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import features
+import model_store
+
+BACKTEST_CACHE_DIR = os.getenv('BACKTEST_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "backtest"))
+
+# rows per test window (about a quarter of trading days) and the fewest rows a fold trains on
+TEST_SIZE = 63
+MIN_TRAIN = 504
+MAX_FOLDS = 8
+
+# a prediction within this many percent of the actual high counts as accurate, as in train_model
+ACCURACY_PCT = 5
+
+
+def fold_bounds(n_rows, test_size=TEST_SIZE, min_train=MIN_TRAIN, max_folds=MAX_FOLDS, train_window=None,
+                purge=features.TARGET_HORIZON):
+    """(train_start, train_end, test_start, test_end) row ranges of the walk-forward folds, the latest last.
+
+    train_end is test_start - purge, so no training label reaches into the test window, and
+    the last purge rows, whose labels do not exist yet, are left out of every test window.
+    """
+    bounds = []
+    test_end = n_rows - purge
+    while len(bounds) < max_folds and test_end - test_size - purge >= min_train:
+        test_start = test_end - test_size
+        train_end = test_start - purge
+        train_start = max(0, train_end - train_window) if train_window else 0
+        bounds.append((train_start, train_end, test_start, test_end))
+        test_end = test_start
+    return bounds[::-1]
+
+
+def load_fold_features(ticker, cache_dir=BACKTEST_CACHE_DIR):
+    """(X, y, close) arrays of a ticker as train_model sees them, from the cache when its bars are unchanged."""
+    import StockAI
+
+    raw = StockAI.fetch_stock_data(ticker, StockAI.START_DATE, StockAI.END_DATE)
+    if raw is None or raw.empty:
+        return None
+
+    flat = features._flat_prices(raw)
+    key = model_store.hash_arrays(flat.index.asi8, flat.to_numpy(dtype=np.float64)) + f"-v{features.FEATURE_SET_VERSION}"
+    path = os.path.join(cache_dir, f"{ticker}.npz")
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            if str(cached["key"]) == key:
+                return cached["X"], cached["y"], cached["close"]
+
+    df = StockAI.prepare_data(raw, ticker)
+    X = df[("MA5", ticker)].to_numpy(dtype=np.float64).reshape(-1, 1)
+    y = df[("Future_High", ticker)].to_numpy(dtype=np.float64)
+    close = df[("Close", ticker)].to_numpy(dtype=np.float64)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # written under a temporary name so a reader never loads half a file
+    tmp_path = path + f".{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, key=np.array(key), X=X, y=y, close=close)
+    os.replace(tmp_path, path)
+    return X, y, close
+
+
+def fold_metrics(y_true, y_pred, close, fold):
+    """Per-fold and overall error metrics, computed over all folds' predictions at once."""
+    n_folds = int(fold.max()) + 1
+    counts = np.bincount(fold, minlength=n_folds)
+    error = y_pred - y_true
+    abs_error = np.abs(error)
+    accurate = (abs_error / np.abs(y_true) * 100 <= ACCURACY_PCT)
+    # did the model call the direction of the move from today's close to the future high
+    direction_hit = np.sign(y_pred - close) == np.sign(y_true - close)
+
+    def per_fold(values):
+        return np.bincount(fold, weights=values.astype(np.float64), minlength=n_folds) / counts
+
+    return {
+        "folds": n_folds,
+        "n_test": int(len(y_true)),
+        "mae": float(abs_error.mean()),
+        "rmse": float(np.sqrt(np.mean(error ** 2))),
+        "mape": float(np.mean(abs_error / np.abs(y_true)) * 100),
+        "accuracy": float(accurate.mean()),
+        "direction_hit": float(direction_hit.mean()),
+        "fold_mae": per_fold(abs_error).round(4).tolist(),
+        "fold_accuracy": per_fold(accurate).round(4).tolist(),
+    }
+
+
+def backtest_ticker(ticker, params, test_size=TEST_SIZE, min_train=MIN_TRAIN, max_folds=MAX_FOLDS,
+                    train_window=None, n_jobs=None, cache_dir=BACKTEST_CACHE_DIR):
+    """Walk-forward metrics of one ticker, or {"error": ...}. Runs in a pool worker."""
+    import xgboost as xgb
+
+    start = time.time()
+    try:
+        loaded = load_fold_features(ticker, cache_dir)
+        if loaded is None:
+            return {"ticker": ticker, "error": "no data"}
+        X, y, close = loaded
+
+        bounds = fold_bounds(len(y), test_size, min_train, max_folds, train_window)
+        if not bounds:
+            return {"ticker": ticker, "error": f"only {len(y)} rows, too few for one fold"}
+
+        predictions = []
+        for train_start, train_end, test_start, test_end in bounds:
+            model = xgb.XGBRegressor(**params, n_jobs=n_jobs)
+            model.fit(X[train_start:train_end], y[train_start:train_end])
+            predictions.append(model.predict(X[test_start:test_end]))
+
+        # the test windows are contiguous, from the first one's start to the last one's end
+        first_test, last_test = bounds[0][2], bounds[-1][3]
+        y_pred = np.concatenate(predictions)
+        fold = np.repeat(np.arange(len(bounds)), [test_end - test_start for _, _, test_start, test_end in bounds])
+        metrics = fold_metrics(y[first_test:last_test], y_pred, close[first_test:last_test], fold)
+        return {"ticker": ticker, **metrics, "seconds": round(time.time() - start, 3)}
+    except Exception as e:
+        return {"ticker": ticker, "error": str(e)}
+
+
+def aggregate(results):
+    """Across tickers: mean and median of each metric, and the test-row weighted pooled values."""
+    scored = [result for result in results if "error" not in result]
+    if not scored:
+        return {"tickers": 0, "failed": len(results)}
+
+    weights = np.array([result["n_test"] for result in scored], dtype=np.float64)
+    summary = {"tickers": len(scored), "failed": len(results) - len(scored), "n_test": int(weights.sum())}
+    for name in ("mae", "rmse", "mape", "accuracy", "direction_hit"):
+        values = np.array([result[name] for result in scored])
+        summary[name] = {
+            "mean": float(values.mean()),
+            "median": float(np.median(values)),
+            "pooled": float(np.average(values, weights=weights)) if name != "rmse"
+            else float(np.sqrt(np.average(values ** 2, weights=weights))),
+        }
+    return summary
+
+
+def run_backtest(tickers, params, workers=1, **fold_options):
+    """Backtest every ticker, on a process pool when workers > 1. Returns the full report."""
+    started = time.time()
+    if workers > 1:
+        # same split as StockAI: each worker's XGBoost gets its share of the cores
+        n_jobs = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(backtest_ticker, ticker, params, n_jobs=n_jobs, **fold_options) for ticker in tickers]
+            results = [future.result() for future in futures]
+    else:
+        results = [backtest_ticker(ticker, params, **fold_options) for ticker in tickers]
+
+    return {
+        "params": params,
+        "folds": fold_options,
+        "workers": workers,
+        "total_s": round(time.time() - started, 3),
+        "aggregate": aggregate(results),
+        "tickers": results,
+    }
+
+
+def _param(text):
+    name, _, value = text.partition("=")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the gain predictor.")
+    parser.add_argument("--workers", type=int, default=1, help="tickers backtested at once")
+    parser.add_argument("--tickers", nargs="*", help="default: every ticker in StockPool")
+    parser.add_argument("--param", type=_param, action="append", default=[],
+                        help="override one of StockAI.MODEL_PARAMS, e.g. max_depth=5")
+    parser.add_argument("--test-size", type=int, default=TEST_SIZE)
+    parser.add_argument("--min-train", type=int, default=MIN_TRAIN)
+    parser.add_argument("--folds", type=int, default=MAX_FOLDS)
+    parser.add_argument("--train-window", type=int, help="train on only this many rows before each window (default: all)")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    import StockAI
+
+    tickers = args.tickers or [ticker for _, ticker in StockAI.get_stock_tickers_from_db()]
+    params = {**StockAI.MODEL_PARAMS, **dict(args.param)}
+    report = run_backtest(tickers, params, workers=args.workers, test_size=args.test_size,
+                          min_train=args.min_train, max_folds=args.folds, train_window=args.train_window)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    summary = report["aggregate"]
+    print(f"{summary['tickers']} tickers backtested, {summary['failed']} failed, in {report['total_s']:.1f}s")
+    for name in ("mae", "rmse", "mape", "accuracy", "direction_hit"):
+        if name in summary:
+            stats = summary[name]
+            print(f"  {name:<14} mean {stats['mean']:10.4f}  median {stats['median']:10.4f}  pooled {stats['pooled']:10.4f}")
@@ -0,0 +1,99 @@
+"""Sync (gunicorn + Flask) vs async (uvicorn + Starlette) on the read routes at high concurrency.
+
+Start both servers against the same database, e.g.
+    gunicorn -c gunicorn.conf.py app:app                              # WEB_PORT=5000
+    uvicorn async_app:app --port 5001 --workers 4
+then log in once on the sync app and drive the same GETs at both:
+    python bench/async_compare.py --email bench0@load.test --password bench-password \
+        --sync http://localhost:5000 --async http://localhost:5001 --connections 1000 --duration 30
+(bench/load.py seeds the bench users.) Prints one JSON object with both results.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+ROUTES = ["/api/dashboard", "/api/portfolio", "/api/suggestions", "/api/industries"]
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] if sorted_values else None
+
+
+async def connection(client, token, deadline, offset, timings, errors):
+    """One keep-alive connection's worth of requests, cycling through the routes."""
+    headers = {"Authorization": f"Bearer {token}"}
+    i = offset
+    while time.perf_counter() < deadline:
+        route = ROUTES[i % len(ROUTES)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(route, headers=headers)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        timings.append(time.perf_counter() - start)
+        if not ok:
+            errors.append(route)
+
+
+async def drive(base_url, token, connections, duration):
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    timings, errors = [], []
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(connection(client, token, deadline, i, timings, errors) for i in range(connections)))
+        elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        "url": base_url,
+        "requests": len(timings),
+        "errors": len(errors),
+        "throughput_rps": round(len(timings) / elapsed, 2),
+        "mean_ms": round(statistics.fmean(timings) * 1000, 3) if timings else None,
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 3) if timings else None,
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3) if timings else None,
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3) if timings else None,
+    }
+
+
+def login(base_url, email, password):
+    response = httpx.post(f"{base_url}/api/login", json={"email": email, "password": password}, timeout=30)
+    response.raise_for_status()
+    return response.json()["token"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sync", dest="sync_url", default="http://localhost:5000")
+    parser.add_argument("--async", dest="async_url", default="http://localhost:5001")
+    parser.add_argument("--email", default="bench0@load.test")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    # logins stay on the sync app, the token is valid on both
+    token = login(args.sync_url, args.email, args.password)
+    result = {
+        "connections": args.connections,
+        "duration_s": args.duration,
+        "sync": asyncio.run(drive(args.sync_url, token, args.connections, args.duration)),
+        "async": asyncio.run(drive(args.async_url, token, args.connections, args.duration)),
+    }
+    output = json.dumps(result, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
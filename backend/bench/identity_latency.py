@@ -0,0 +1,81 @@
+"""Before/after latency of authenticated routes with and without identity claims in the JWT.
+
+A token carrying only the email identity (how tokens were issued before) makes every
+route look the user up first; a token from the current login() carries user_id and
+first_name and goes straight to the route's real query.
+
+Needs the backend .env and a seeded database (db_script.py):
+    python bench/identity_latency.py --email john.doe@test.com --requests 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from psycopg2.extras import RealDictCursor  # noqa: E402
+
+from app import app, get_db_connection  # noqa: E402
+
+ROUTES = ["/api/dashboard", "/api/portfolio", "/api/suggestions"]
+
+
+def make_tokens(email):
+    with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT user_id, first_name FROM AccountUser WHERE email = %s", (email,))
+        user = cur.fetchone()
+    if not user:
+        raise SystemExit(f"No user with email {email}")
+
+    with app.app_context():
+        before = create_access_token(identity=email)
+        after = create_access_token(
+            identity=email,
+            additional_claims={"user_id": user["user_id"], "first_name": user["first_name"]}
+        )
+    return before, after
+
+
+def time_route(client, route, token, requests):
+    headers = {"Authorization": f"Bearer {token}"}
+    # warm the pool and the query plans before measuring
+    for _ in range(10):
+        client.get(route, headers=headers)
+
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(route, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f"{route} returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    timings.sort()
+    return {
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--email", default="john.doe@test.com")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    before, after = make_tokens(args.email)
+    client = app.test_client()
+
+    print(f"{'route':<20}{'before p50':>12}{'after p50':>12}{'before p95':>12}{'after p95':>12}")
+    for route in ROUTES:
+        b = time_route(client, route, before, args.requests)
+        a = time_route(client, route, after, args.requests)
+        print(f"{route:<20}{b['p50_ms']:>10.2f}ms{a['p50_ms']:>10.2f}ms{b['p95_ms']:>10.2f}ms{a['p95_ms']:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
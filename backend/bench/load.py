@@ -0,0 +1,275 @@
+"""HTTP load test: seed synthetic users and lots, drive a mixed workload, report latency percentiles.
+
+Needs a local PostgreSQL with the migrations applied (db_script.py) and the backend .env.
+Without --url the requests go through the app in-process (Flask test client), so no server
+has to be running; with --url they go over HTTP to a running server:
+    python bench/load.py --users 200 --lots 50 --threads 8 --duration 30 --json bench-load.json
+    python bench/load.py --url http://localhost:5000 --threads 32 --duration 60
+    python bench/load.py --cleanup
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import bcrypt
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import db  # noqa: E402
+import db_script  # noqa: E402
+import passwords  # noqa: E402
+
+EMAIL_DOMAIN = "load.test"
+PASSWORD = "bench-password"
+# stock_IDs whose AISuggestions row seed() made up, deleted again by cleanup()
+SEEDED_RATINGS_TABLE = "bench_seeded_ratings"
+
+# share of requests per route, roughly what the dashboard generates
+MIX = {
+    "portfolio": 0.50,
+    "suggestions": 0.30,
+    "addstock": 0.15,
+    "login": 0.05,
+}
+
+
+def bench_email(i):
+    return f"bench{i}@{EMAIL_DOMAIN}"
+
+
+def seed(conn, users, lots_per_user, rng):
+    """Create the bench users and their lots (idempotent), plus sample industries, stocks and ratings if missing."""
+    db_script.seed_sample_data(conn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT industry_ID FROM Industry")
+        industry_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT stock_ID, ticker_symbol FROM StockPool")
+        stocks = cur.fetchall()
+
+        # suggestions need ratings, give unrated stocks a random one and remember which,
+        # so cleanup() removes them and not the ratings StockAI wrote
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {SEEDED_RATINGS_TABLE} (stock_ID INT PRIMARY KEY)")
+        cur.execute(f"""
+            WITH seeded AS (
+                INSERT INTO AISuggestions (Industry_ID, stock_ID, Rating)
+                SELECT %s, sp.stock_ID, round((random() * 5)::numeric, 2)
+                FROM StockPool sp
+                WHERE NOT EXISTS (SELECT 1 FROM AISuggestions ai WHERE ai.stock_ID = sp.stock_ID)
+                RETURNING stock_ID
+            )
+            INSERT INTO {SEEDED_RATINGS_TABLE} (stock_ID) SELECT stock_ID FROM seeded
+            ON CONFLICT (stock_ID) DO NOTHING
+        """, (industry_ids[0],))
+
+        # one hash for every bench user, hashing thousands of times would dominate the setup
+        hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(passwords.BCRYPT_ROUNDS)).decode("utf-8")
+        execute_values(cur, """
+            INSERT INTO AccountUser (first_name, last_name, email, password) VALUES %s
+            ON CONFLICT (email) DO NOTHING
+        """, [("Bench", str(i), bench_email(i), hashed) for i in range(users)], page_size=1000)
+
+        cur.execute("""
+            SELECT u.user_ID FROM AccountUser u
+            WHERE u.email LIKE %s AND NOT EXISTS (SELECT 1 FROM StockEntry s WHERE s.user_ID = u.user_ID)
+        """, ("%@" + EMAIL_DOMAIN,))
+        empty_users = [row[0] for row in cur.fetchall()]
+
+        lots = []
+        for user_id in empty_users:
+            for _ in range(lots_per_user):
+                lots.append((
+                    user_id,
+                    rng.choice(industry_ids),
+                    rng.choice(stocks)[1],
+                    rng.randint(1, 500),
+                    f"20{rng.randint(15, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    round(rng.uniform(5, 900), 2),
+                ))
+        execute_values(cur, """
+            INSERT INTO StockEntry (user_ID, Industry_ID, stock, number, date, price_per_share) VALUES %s
+        """, lots, page_size=5000)
+    conn.commit()
+    return industry_ids, [ticker for _, ticker in stocks]
+
+
+def cleanup(conn):
+    with conn.cursor() as cur:
+        # lots go with their users (ON DELETE CASCADE)
+        cur.execute("DELETE FROM AccountUser WHERE email LIKE %s", ("%@" + EMAIL_DOMAIN,))
+        print(f"Deleted {cur.rowcount} bench users")
+
+        cur.execute("SELECT to_regclass(%s)", (SEEDED_RATINGS_TABLE,))
+        if cur.fetchone()[0] is not None:
+            cur.execute(f"""
+                DELETE FROM AISuggestions ai USING {SEEDED_RATINGS_TABLE} b WHERE ai.stock_ID = b.stock_ID
+            """)
+            print(f"Deleted {cur.rowcount} seeded ratings")
+            cur.execute(f"DROP TABLE {SEEDED_RATINGS_TABLE}")
+    conn.commit()
+
+
+class InProcessClient:
+    """Requests through the Flask test client, nothing but the app and the database involved."""
+
+    def __init__(self):
+        from app import app
+        # no cookie jar, so the worker threads can share the client
+        self._client = app.test_client(use_cookies=False)
+
+    def request(self, method, path, body=None, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = self._client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Requests over HTTP to a running server, with the standard library only."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, body=None, token=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header("Content-Type", "application/json")
+        if token:
+            req.add_header("Authorization", f"Bearer {token}")
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+def run_worker(client, users, industry_ids, tickers, deadline, seed_value, results, lock):
+    rng = random.Random(seed_value)
+    routes, weights = list(MIX), list(MIX.values())
+    token = None
+    local = {route: [] for route in MIX}
+    errors = {route: 0 for route in MIX}
+
+    def timed(route, method, path, body=None):
+        start = time.perf_counter()
+        status, payload = client.request(method, path, body, token)
+        local[route].append(time.perf_counter() - start)
+        if status >= 400:
+            errors[route] += 1
+        return status, payload
+
+    while time.perf_counter() < deadline:
+        route = "login" if token is None else rng.choices(routes, weights)[0]
+        if route == "login":
+            status, payload = timed("login", "POST", "/api/login",
+                                    {"email": bench_email(rng.randrange(users)), "password": PASSWORD})
+            token = payload["token"] if status == 200 and payload else None
+            if token is None:
+                time.sleep(0.05)
+        elif route == "portfolio":
+            timed("portfolio", "GET", "/api/portfolio")
+        elif route == "suggestions":
+            timed("suggestions", "GET", "/api/suggestions")
+        elif route == "addstock":
+            timed("addstock", "POST", "/api/addstock", {
+                "stock": rng.choice(tickers),
+                "industry_id": rng.choice(industry_ids),
+                "number": rng.randint(1, 100),
+                "price_per_share": round(rng.uniform(5, 900), 2),
+                "date": "2024-06-03",
+            })
+
+    with lock:
+        for route in MIX:
+            results["timings"][route].extend(local[route])
+            results["errors"][route] += errors[route]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(timings, errors, elapsed):
+    routes = {}
+    for route, values in timings.items():
+        values = sorted(values)
+        routes[route] = {
+            "requests": len(values),
+            "errors": errors[route],
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(statistics.fmean(values) * 1000, 3) if values else None,
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3) if values else None,
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3) if values else None,
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3) if values else None,
+        }
+    everything = sorted(value for values in timings.values() for value in values)
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "throughput_rps": round(len(everything) / elapsed, 2),
+        "p50_ms": round(percentile(everything, 0.50) * 1000, 3) if everything else None,
+        "p95_ms": round(percentile(everything, 0.95) * 1000, 3) if everything else None,
+        "p99_ms": round(percentile(everything, 0.99) * 1000, 3) if everything else None,
+        "routes": routes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--lots", type=int, default=50, help="lots seeded per user")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--url", help="base URL of a running server, default: in-process")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--cleanup", action="store_true", help="delete the bench users, their lots and the seeded ratings, then exit")
+    args = parser.parse_args()
+
+    conn = db.connect()
+    try:
+        if args.cleanup:
+            cleanup(conn)
+            return
+        industry_ids, tickers = seed(conn, args.users, args.lots, random.Random(args.seed))
+    finally:
+        conn.close()
+
+    client = HttpClient(args.url) if args.url else InProcessClient()
+    results = {"timings": {route: [] for route in MIX}, "errors": {route: 0 for route in MIX}}
+    lock = threading.Lock()
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=run_worker,
+                         args=(client, args.users, industry_ids, tickers, deadline, args.seed * 1000 + i, results, lock))
+        for i in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(results["timings"], results["errors"], elapsed)
+    summary.update({"target": args.url or "in-process", "users": args.users, "lots_per_user": args.lots,
+                    "threads": args.threads, "mix": MIX})
+    output = json.dumps(summary, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
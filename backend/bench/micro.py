@@ -0,0 +1,191 @@
+"""Micro-benchmarks of the AI refresh hot spots on synthetic OHLCV, with JSON output.
+
+Runs offline; the ratings writer needs a local PostgreSQL and only runs with --db:
+    python bench/micro.py --json bench-micro.json
+    python bench/micro.py --compare bench-micro.json          # exit 1 on a regression
+    python bench/micro.py --db --json bench-micro.json        # also time update_ai_suggestions
+
+Each bench_* function takes a pytest-benchmark style `benchmark` callable, so the same
+functions also run under pytest-benchmark:
+    pytest bench/micro.py -o python_files=micro.py -o python_functions='bench_*' --benchmark-json=out.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import model_store  # noqa: E402
+import StockAI  # noqa: E402
+from bench.synthetic import synthetic_universe  # noqa: E402
+
+DAYS = 2520
+RATED_STOCKS = 5000
+BENCH_TICKER_PREFIX = "ZB"
+
+
+class Benchmark:
+    """Minimal stand-in for pytest-benchmark's fixture: benchmark(fn, *args) times fn over rounds."""
+
+    def __init__(self, rounds):
+        self.rounds = rounds
+        self.timings = []
+
+    def __call__(self, fn, *args, **kwargs):
+        result = None
+        # StockAI prints progress for every ticker, keep it out of the measurements
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(*args, **kwargs)  # warm-up
+            for _ in range(self.rounds):
+                start = time.perf_counter()
+                result = fn(*args, **kwargs)
+                self.timings.append(time.perf_counter() - start)
+        return result
+
+    def summary(self):
+        return {
+            "rounds": len(self.timings),
+            "min_s": min(self.timings),
+            "median_s": statistics.median(self.timings),
+            "mean_s": statistics.fmean(self.timings),
+            "max_s": max(self.timings),
+            "stdev_s": statistics.stdev(self.timings) if len(self.timings) > 1 else 0.0,
+        }
+
+
+def _one_ticker():
+    return next(iter(synthetic_universe(1, days=DAYS, seed=1).items()))
+
+
+def bench_prepare_data(benchmark):
+    ticker, raw = _one_ticker()
+    benchmark(StockAI.prepare_data, raw, ticker)
+
+
+def bench_train_model(benchmark):
+    ticker, raw = _one_ticker()
+    df = StockAI.prepare_data(raw, ticker)
+    benchmark(StockAI.train_model, df, ticker, {}, None, None)
+
+
+def bench_train_model_cached(benchmark):
+    """A refresh over unchanged data: hashing the training rows and reusing the stored prediction."""
+    ticker, raw = _one_ticker()
+    df = StockAI.prepare_data(raw, ticker)
+    with tempfile.TemporaryDirectory() as root:
+        store = model_store.ModelStore(root)
+        with contextlib.redirect_stdout(io.StringIO()):
+            StockAI.train_model(df, ticker, {}, store=store)
+        benchmark(StockAI.train_model, df, ticker, {}, None, store)
+
+
+def bench_compute_ratings(benchmark):
+    gains = {stock_id: (stock_id % 97) / 10 - 4 for stock_id in range(1, RATED_STOCKS + 1)}
+    benchmark(StockAI.compute_ratings, gains)
+
+
+def bench_update_ai_suggestions(benchmark):
+    """The ratings writer against a local database, on RATED_STOCKS bench-only StockPool rows.
+
+    update_ai_suggestions commits on its own connection, so the bench rows are deleted
+    afterwards instead of rolled back; their ratings go with them (ON DELETE CASCADE).
+    """
+    conn = StockAI.get_db_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO StockPool (ticker_symbol, name)
+                SELECT %s || lpad(n::text, 5, '0'), 'Benchmark stock ' || n FROM generate_series(1, %s) n
+                ON CONFLICT (ticker_symbol) DO NOTHING
+            """, (BENCH_TICKER_PREFIX, RATED_STOCKS))
+            cur.execute("SELECT stock_ID FROM StockPool WHERE ticker_symbol LIKE %s ORDER BY stock_ID",
+                        (BENCH_TICKER_PREFIX + "%",))
+            stock_ids = [row[0] for row in cur.fetchall()]
+
+        gains = {stock_id: (stock_id % 97) / 10 - 4 for stock_id in stock_ids}
+        benchmark(StockAI.update_ai_suggestions, gains)
+    finally:
+        with conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM StockPool WHERE ticker_symbol LIKE %s", (BENCH_TICKER_PREFIX + "%",))
+        conn.close()
+
+
+OFFLINE = [bench_prepare_data, bench_train_model, bench_train_model_cached, bench_compute_ratings]
+NEEDS_DB = [bench_update_ai_suggestions]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline, threshold):
+    """Names of benchmarks whose median is more than threshold times the baseline's."""
+    before = {bench["name"]: bench for bench in baseline["benchmarks"]}
+    regressions = []
+    for bench in result["benchmarks"]:
+        old = before.get(bench["name"])
+        if not old:
+            continue
+        ratio = bench["median_s"] / old["median_s"]
+        bench["baseline_median_s"] = old["median_s"]
+        bench["ratio"] = round(ratio, 3)
+        if ratio > threshold:
+            regressions.append(bench["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--db", action="store_true", help="also run the benchmarks that need a local database")
+    parser.add_argument("--only", help="run only benchmarks whose name contains this")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.2, help="median ratio that counts as a regression")
+    args = parser.parse_args()
+
+    benches = OFFLINE + (NEEDS_DB if args.db else [])
+    if args.only:
+        benches = [bench for bench in benches if args.only in bench.__name__]
+
+    result = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "benchmarks": [],
+    }
+    for bench in benches:
+        benchmark = Benchmark(args.rounds)
+        bench(benchmark)
+        result["benchmarks"].append({"name": bench.__name__[len("bench_"):], **benchmark.summary()})
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        result["regressions"] = regressions
+
+    output = json.dumps(result, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output)
+    print(output)
+    if regressions:
+        print(f"Slower than the baseline by more than {args.threshold}x: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Pooled cross-ticker model vs the per-ticker XGBoost loop: training time, peak memory and error.
+
+Runs offline on synthetic bars. Every (engine, universe size) case runs in a fresh process,
+so peak RSS is that case's own; both engines get the same features, held-out rows and
+thread budget:
+    python bench/pooled.py --sizes 30 500 5000 --threads 8 --json bench-pooled.json
+Error is measured on each ticker's last 20% of rows, the split train_model evaluates on,
+less its final TARGET_HORIZON rows, whose Future_High is forward-filled rather than observed.
+Training memory is the peak RSS while fitting over the RSS when fitting starts, so it is
+not hidden by the feature panel build, which sets the process's overall peak.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import backtest  # noqa: E402
+import features  # noqa: E402
+import memory_usage  # noqa: E402
+import pooled_model  # noqa: E402
+import StockAI  # noqa: E402
+from bench.synthetic import synthetic_universe  # noqa: E402
+
+ENGINES = ("per_ticker", "pooled")
+# synthetic industries assigned round-robin, roughly the number of GICS sectors
+N_INDUSTRIES = 11
+
+
+def train_per_ticker(panel, n_threads):
+    """train_model's fit for every ticker: MA5 only, first 80% of rows, predict the rest."""
+    import xgboost as xgb
+
+    train, _ = pooled_model.split_rows(panel)
+    y_true, y_pred, close = [], [], []
+    offset = 0
+    for _, rows in panel.groupby(level="Ticker", sort=False):
+        n = len(rows)
+        in_train = train[offset:offset + n]
+        offset += n
+        X = rows[[f"MA{features.MA_WINDOWS[0]}"]].to_numpy(dtype=np.float64)
+        y = rows["Future_High"].to_numpy(dtype=np.float64)
+
+        model = xgb.XGBRegressor(**StockAI.MODEL_PARAMS, n_jobs=n_threads)
+        model.fit(X[in_train], y[in_train])
+        y_pred.append(model.predict(X[~in_train]).astype(np.float64))
+        y_true.append(y[~in_train])
+        close.append(rows["Close"].to_numpy(dtype=np.float64)[~in_train])
+    return np.concatenate(y_true), np.concatenate(y_pred), np.concatenate(close)
+
+
+def scored_rows(panel):
+    """Mask over the held-out rows (in panel order) of those whose target was observed."""
+    train, _ = pooled_model.split_rows(panel)
+    position = panel.groupby(level="Ticker", sort=False).cumcount().to_numpy()
+    size = panel.groupby(level="Ticker", sort=False)["Close"].transform("size").to_numpy()
+    return (position < size - features.TARGET_HORIZON)[~train]
+
+
+def run_case(engine, n_tickers, days, n_threads, seed):
+    """One engine on one universe, in its own process. Returns timings, peak RSS and error metrics."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        raw_frames = synthetic_universe(n_tickers, days=days, seed=seed)
+        panel = features.build_feature_panel(raw_frames)
+        del raw_frames
+        industries = {ticker: i % N_INDUSTRIES for i, ticker in enumerate(panel.index.get_level_values("Ticker").unique())}
+        peak_before_train = memory_usage.peak_rss_mb()
+        rss_before_train = memory_usage.rss_mb()
+        # where the peak cannot be reset, only training above the panel build's peak shows
+        peak_reset = memory_usage.reset_peak_rss()
+
+        start = time.perf_counter()
+        if engine == "pooled":
+            result = pooled_model.train_pooled(panel, industries, n_threads=n_threads)
+            y_true, y_pred, close = result["y_true"], result["y_pred"], result["close"]
+        else:
+            y_true, y_pred, close = train_per_ticker(panel, n_threads)
+        train_s = time.perf_counter() - start
+        train_peak = memory_usage.peak_rss_mb()
+
+    scored = scored_rows(panel)
+    y_true, y_pred, close = y_true[scored], y_pred[scored], close[scored]
+    error = backtest.fold_metrics(y_true, y_pred, close, np.zeros(len(y_true), dtype=np.int64))
+    return {
+        "engine": engine,
+        "tickers": n_tickers,
+        "rows": len(panel),
+        "n_scored": int(scored.sum()),
+        "train_s": round(train_s, 3),
+        "peak_rss_mb": round(max(peak_before_train, train_peak), 1),
+        "peak_rss_before_train_mb": round(peak_before_train, 1),
+        "train_rss_mb": round(train_peak - (rss_before_train if peak_reset else peak_before_train), 1),
+        **{name: round(error[name], 6) for name in ("mae", "rmse", "mape", "accuracy", "direction_hit")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 500, 5000])
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--days", type=int, default=2520)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="XGBoost threads for both engines")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    cases = []
+    for size in args.sizes:
+        for engine in args.engines:
+            # a new process per case, so the peak RSS is not carried over from the previous one
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                case = pool.submit(run_case, engine, size, args.days, args.threads, args.seed).result()
+            print(json.dumps(case), file=sys.stderr)
+            cases.append(case)
+
+    result = {"days": args.days, "threads": args.threads, "cases": cases}
+    output = json.dumps(result, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Check that the panel feature pass matches prepare_data exactly, and time both.
+
+Runs offline on synthetic bars:
+    python bench/prepare_panel.py --tickers 500 --days 2520
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import features  # noqa: E402
+import StockAI  # noqa: E402
+from bench.synthetic import synthetic_universe  # noqa: E402
+
+COMPARED_FIELDS = features.PRICE_FIELDS + ["Future_High", "MA5"]
+
+
+def compare(per_ticker, panel):
+    """Tickers whose panel slice differs from prepare_data, with the first differing field."""
+    mismatches = {}
+    for ticker, expected in per_ticker.items():
+        actual = features.to_ticker_frame(panel, ticker)
+        if not expected.index.equals(actual.index):
+            mismatches[ticker] = "index"
+            continue
+        for field in COMPARED_FIELDS:
+            left = expected[(field, ticker)].to_numpy(dtype=np.float64)
+            right = actual[(field, ticker)].to_numpy(dtype=np.float64)
+            if not np.array_equal(left, right, equal_nan=True):
+                mismatches[ticker] = field
+                break
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=2520)
+    parser.add_argument("--nan-rate", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    raw_frames = synthetic_universe(args.tickers, days=args.days, seed=args.seed, nan_rate=args.nan_rate)
+
+    start = time.perf_counter()
+    per_ticker = {ticker: StockAI.prepare_data(df, ticker) for ticker, df in raw_frames.items()}
+    per_ticker_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    panel = features.build_feature_panel(raw_frames)
+    panel_s = time.perf_counter() - start
+
+    mismatches = compare(per_ticker, panel)
+    result = {
+        "tickers": args.tickers,
+        "days": args.days,
+        "per_ticker_s": round(per_ticker_s, 4),
+        "panel_s": round(panel_s, 4),
+        "speedup": round(per_ticker_s / panel_s, 2) if panel_s else None,
+        "mismatched_tickers": len(mismatches),
+    }
+    print(json.dumps(result))
+    if mismatches:
+        print(f"Panel output differs from prepare_data: {dict(list(mismatches.items())[:10])}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Import time and resident memory of the web process, with and without the ML stack.
+
+Each scenario is imported in a fresh interpreter. "api" is what a web worker loads now.
+"api+StockAI" adds the StockAI import that app.py used to do at module load, i.e. the
+before state. Needs the backend requirements installed but no database:
+    python bench/startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SCENARIOS = {
+    "api": "import app",
+    "api+StockAI": "import app, StockAI",
+}
+
+# modules the web process should not load
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "sklearn", "xgboost", "yfinance", "pyarrow"]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+rss_kb = None
+try:
+    with open("/proc/self/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+except OSError:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"import_s": elapsed, "rss_mb": rss_kb / 1024,
+                  "heavy": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+
+def measure(imports, runs):
+    code = PROBE.format(imports=imports, heavy=HEAVY_MODULES)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "import_s": round(statistics.median(s["import_s"] for s in samples), 4),
+        "rss_mb": round(statistics.median(s["rss_mb"] for s in samples), 1),
+        "heavy_modules": samples[-1]["heavy"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    result = {name: measure(imports, args.runs) for name, imports in SCENARIOS.items()}
+    result["runs"] = args.runs
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Synthetic daily OHLCV bars for offline benchmarks, in the layout fetch_stock_data returns."""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import price_store  # noqa: E402
+
+
+def synthetic_bars(ticker, days=2520, seed=0, nan_rate=0.0, start="2014-01-02"):
+    """One ticker's flat OHLCV frame: a geometric random walk on business days."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=days, name="Date")
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, days)))
+    spread = np.abs(rng.normal(0, 0.01, days)) * close
+    data = pd.DataFrame({
+        "Close": close,
+        "High": close + spread,
+        "Low": close - spread,
+        "Open": close + rng.normal(0, 0.005, days) * close,
+        "Volume": rng.integers(100_000, 10_000_000, days).astype(np.float64),
+    }, index=dates)
+
+    if nan_rate:
+        # missing prints, so the feature code has gaps to fill
+        holes = rng.random((days, len(data.columns))) < nan_rate
+        data = data.mask(holes)
+    return data
+
+
+def synthetic_universe(n_tickers, days=2520, seed=0, nan_rate=0.0):
+    """{ticker: raw frame} for n_tickers with staggered listing dates, like fetch_stock_data output."""
+    rng = np.random.default_rng(seed)
+    frames = {}
+    for i in range(n_tickers):
+        ticker = f"T{i:04d}"
+        # some tickers list later, so series lengths differ
+        listed = days - int(rng.integers(0, days // 4)) if i % 3 == 0 else days
+        bars = synthetic_bars(ticker, days=listed, seed=seed + i, nan_rate=nan_rate,
+                              start=(pd.Timestamp("2014-01-02") + pd.offsets.BDay(days - listed)).date().isoformat())
+        frame = price_store.to_download_frame(bars, ticker)
+        frame["Ticker"] = ticker
+        frames[ticker] = frame
+    return frames
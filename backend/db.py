@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of PostgreSQL connections shared by the app.
+
+    Connections are opened lazily, so importing the app does not need a
+    reachable database. Use ``connection()`` as a context manager: the
+    connection is always handed back, and any transaction left open (or
+    failed) is rolled back before it is reused.
+    """
+
+    def __init__(self, minconn=1, maxconn=10, timeout=5.0, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._connect_kwargs = connect_kwargs
+        self._pool = None
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # the semaphore is what bounds the pool and lets callers wait for a free slot,
+        # psycopg2's pool itself raises immediately when it is exhausted
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._init_lock:
+                if self._pool is None:
+                    self._pool = pool.ThreadedConnectionPool(self.minconn, self.maxconn, **self._connect_kwargs)
+        return self._pool
+
+    def _acquire(self):
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        waited = time.perf_counter() - start
+
+        with self._stats_lock:
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            if not acquired:
+                self._timeouts += 1
+
+        if not acquired:
+            raise PoolTimeout(f"No database connection available after {self.timeout:.1f}s")
+
+        try:
+            conn = self._get_pool().getconn()
+            # the server may have dropped an idle connection, replace it instead of handing it out
+            if conn.closed:
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._stats_lock:
+            self._in_use += 1
+            self._checkouts += 1
+        return conn
+
+    def _release(self, conn, discard=False):
+        try:
+            if not conn.closed and not discard:
+                # read-only handlers never commit, so reset the session before reuse
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except psycopg2.Error:
+            discard = True
+        finally:
+            discard = discard or bool(conn.closed)
+            self._pool.putconn(conn, close=discard)
+            with self._stats_lock:
+                self._in_use -= 1
+                if discard:
+                    self._discarded += 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection, rolling back on error and always returning it."""
+        conn = self._acquire()
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                if not conn.closed:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+            raise
+        finally:
+            self._release(conn, discard)
+
+    def stats(self):
+        """Snapshot of the pool counters, used to size ``DB_POOL_MAX``."""
+        with self._stats_lock:
+            checkouts = self._checkouts
+            return {
+                "size": self.maxconn,
+                "min_size": self.minconn,
+                "open": len(self._pool._pool) + len(self._pool._used) if self._pool else 0,
+                "in_use": self._in_use,
+                "checkouts": checkouts,
+                "checkout_timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "wait_total_ms": round(self._wait_total * 1000, 3),
+                "wait_avg_ms": round(self._wait_total * 1000 / max(checkouts + self._timeouts, 1), 3),
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+
+def connect_kwargs_from_env():
+    """psycopg2 connection arguments from the backend .env."""
+    return {
+        "host": os.getenv('HOST'),
+        "port": os.getenv('PORT'),
+        "database": os.getenv('DATABASE'),
+        "user": os.getenv('USER'),
+        "password": os.getenv('PASSWORD'),
+    }
+
+
+def connect():
+    """Open a single unpooled connection, for worker processes and scripts."""
+    return psycopg2.connect(**connect_kwargs_from_env())
+
+
+def pool_from_env(**connect_kwargs):
+    """Build a pool from the same environment variables the app already uses.
+
+    Extra psycopg2.connect arguments (e.g. connection_factory) are passed to every connection.
+    """
+    return ConnectionPool(
+        minconn=int(os.getenv('DB_POOL_MIN', 1)),
+        maxconn=int(os.getenv('DB_POOL_MAX', 10)),
+        timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+        **connect_kwargs_from_env(),
+        **connect_kwargs
+    )
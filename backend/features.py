@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+# raw daily bar columns, in the order yf.download returns them
+PRICE_FIELDS = ["Close", "High", "Low", "Open", "Volume"]
+
+# the model target: the high 5 trading days ahead
+TARGET_HORIZON = 5
+# moving averages of the high, MA5 is the feature the per-ticker model trains on
+MA_WINDOWS = (5, 10, 20)
+# lags for the lagged high and the trailing return
+LAGS = (1, 5, 10, 20)
+# windows for the rolling volatility of daily returns
+VOLATILITY_WINDOWS = (5, 10, 20)
+
+# version of the feature set above, bump it whenever a feature changes
+FEATURE_SET_VERSION = 1
+
+
+def _flat_prices(df):
+    """Single-level OHLCV columns of one ticker's raw frame (as fetch_stock_data returns it)."""
+    if isinstance(df.columns, pd.MultiIndex):
+        fields = df.columns.get_level_values(0)
+        df = df.loc[:, [field in PRICE_FIELDS for field in fields]]
+        df.columns = df.columns.get_level_values(0)
+    return df[PRICE_FIELDS]
+
+
+def _padded(values, row_idx, col_idx, shape):
+    """Scatter one field of every ticker into a (row x ticker) array padded with NaN."""
+    out = np.full(shape, np.nan)
+    out[row_idx, col_idx] = values
+    return pd.DataFrame(out)
+
+
+def build_feature_panel(raw_frames):
+    """Build features for every ticker in one vectorised pass.
+
+    raw_frames maps ticker to the frame fetch_stock_data returned. Each ticker's bars are
+    laid out from row 0 of its own column in a (row x ticker) array, so shift/rolling/ffill
+    run once over all tickers and still only ever look at that ticker's own rows; the
+    Future_High, MA5 and price columns are exactly what prepare_data computes per ticker.
+
+    Returns a long frame indexed by (Ticker, Date) with the rows prepare_data keeps.
+    Lagged, return and volatility features are extra and may be NaN early in a series.
+    """
+    tickers = list(raw_frames)
+    flats = [_flat_prices(raw_frames[ticker]) for ticker in tickers]
+    lengths = np.array([len(flat) for flat in flats], dtype=np.int64)
+    if len(tickers) == 0 or lengths.max() == 0:
+        return pd.DataFrame(index=pd.MultiIndex.from_arrays([[], []], names=["Ticker", "Date"]))
+
+    shape = (int(lengths.max()), len(tickers))
+    # position of every bar in the padded layout, tickers one after the other
+    col_idx = np.repeat(np.arange(len(tickers)), lengths)
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    row_idx = np.arange(lengths.sum()) - np.repeat(offsets, lengths)
+
+    stacked = pd.concat(flats, ignore_index=True)
+    raw = {field: _padded(stacked[field].to_numpy(dtype=np.float64), row_idx, col_idx, shape) for field in PRICE_FIELDS}
+
+    # same order of operations as prepare_data: features on the raw high, then ffill everything
+    fields = dict(raw)
+    fields["Future_High"] = raw["High"].shift(-TARGET_HORIZON)
+    for window in MA_WINDOWS:
+        fields[f"MA{window}"] = raw["High"].rolling(window=window).mean()
+    fields = {name: frame.ffill() for name, frame in fields.items()}
+
+    # extra features, built from the filled prices
+    daily_return = fields["Close"] / fields["Close"].shift(1) - 1
+    for lag in LAGS:
+        fields[f"High_lag{lag}"] = fields["High"].shift(lag)
+        fields[f"Return_{lag}d"] = fields["Close"] / fields["Close"].shift(lag) - 1
+    for window in VOLATILITY_WINDOWS:
+        fields[f"Volatility_{window}d"] = daily_return.rolling(window=window).std()
+
+    # prepare_data's dropna only sees the prices, Future_High and MA5
+    required = PRICE_FIELDS + ["Future_High", f"MA{MA_WINDOWS[0]}"]
+    keep = np.ones(shape, dtype=bool)
+    for name in required:
+        keep &= fields[name].notna().to_numpy()
+    keep_flat = keep[row_idx, col_idx]
+
+    dates = np.concatenate([flat.index.to_numpy() for flat in flats])
+    index = pd.MultiIndex.from_arrays(
+        [np.asarray(tickers, dtype=object)[col_idx[keep_flat]], dates[keep_flat]],
+        names=["Ticker", "Date"]
+    )
+    rows, cols = row_idx[keep_flat], col_idx[keep_flat]
+    return pd.DataFrame({name: frame.to_numpy()[rows, cols] for name, frame in fields.items()}, index=index)
+
+
+def to_ticker_frame(panel, ticker):
+    """One ticker's rows of a panel in prepare_data's (Price, Ticker) column layout, for train_model."""
+    data = panel.xs(ticker, level="Ticker")
+    frame = pd.DataFrame(index=data.index)
+    for field in PRICE_FIELDS:
+        frame[(field, ticker)] = data[field]
+    frame[("Ticker", "")] = ticker
+    frame[("Future_High", ticker)] = data["Future_High"]
+    frame[(f"MA{MA_WINDOWS[0]}", ticker)] = data[f"MA{MA_WINDOWS[0]}"]
+    frame.columns = pd.MultiIndex.from_tuples(frame.columns, names=["Price", "Ticker"])
+    return frame
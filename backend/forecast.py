@@ -0,0 +1,160 @@
+"""Predicted highs and gains a few trading days ahead, served from the boosters StockAI stores.
+
+prepare_data trains each ticker's booster to predict the high FORECAST_MAX_HORIZON bars
+after a row from that row's MA5, so its predictions for the last FORECAST_MAX_HORIZON bars
+are the forecasts 1 to FORECAST_MAX_HORIZON bars past the latest one, oldest row first.
+
+Boosters are loaded once into the registry and forecasts are memoised until the ticker's
+bars or model file change, so a repeat request costs a dictionary lookup per ticker.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+import model_store
+import price_store
+
+# prepare_data's Future_High is this many bars ahead of its row
+FORECAST_MAX_HORIZON = 5
+# tickers one request may ask for
+FORECAST_MAX_TICKERS = int(os.getenv('FORECAST_MAX_TICKERS', 100))
+# seconds a memoised forecast is served before its bars and model files are checked for changes
+FORECAST_CHECK_S = float(os.getenv('FORECAST_CHECK_S', 60))
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ForecastRegistry:
+    """Stored boosters and their latest forecasts, shared by every request in the process."""
+
+    def __init__(self, models=None, prices=None, check_interval=FORECAST_CHECK_S):
+        self._models = models if models is not None else model_store.ModelStore()
+        self._prices = prices if prices is not None else price_store.PriceStore()
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._boosters = {}   # ticker -> (booster, model file mtime)
+        self._forecasts = {}  # ticker -> (forecast, bars mtime, model mtime, checked_at)
+        self._counts = {"hits": 0, "computed": 0, "model_loads": 0, "missing": 0}
+
+    def _files(self, ticker):
+        model_path, _ = self._models._paths(ticker)
+        bars_path, _ = self._prices._paths(ticker)
+        return _mtime(bars_path), _mtime(model_path), model_path
+
+    def _booster(self, ticker, model_path, model_mtime):
+        import xgboost as xgb
+
+        with self._lock:
+            entry = self._boosters.get(ticker)
+        if entry and entry[1] == model_mtime:
+            return entry[0]
+
+        booster = xgb.Booster()
+        booster.load_model(model_path)
+        with self._lock:
+            self._boosters[ticker] = (booster, model_mtime)
+            self._counts["model_loads"] += 1
+        return booster
+
+    def _inputs(self, ticker):
+        """(last bar date, last close, MA5 of the last FORECAST_MAX_HORIZON bars), or None if too few bars."""
+        bars = self._prices.read(ticker)
+        # MA5 needs 4 bars before the first row fed to the model
+        if len(bars) < FORECAST_MAX_HORIZON + 4:
+            return None
+        high = bars["High"].to_numpy(dtype=np.float64)
+        ma5 = np.convolve(high, np.ones(5) / 5, mode="valid")[-FORECAST_MAX_HORIZON:]
+        return bars.index[-1].date().isoformat(), float(bars["Close"].iloc[-1]), ma5
+
+    def _compute(self, ticker, bars_mtime, model_mtime, model_path):
+        inputs = self._inputs(ticker)
+        if inputs is None:
+            return None
+        as_of, close, ma5 = inputs
+
+        # one predict per booster covers every horizon of the ticker
+        booster = self._booster(ticker, model_path, model_mtime)
+        highs = booster.inplace_predict(ma5.reshape(-1, 1).astype(np.float32))
+        return {
+            "ticker": ticker,
+            "as_of": as_of,
+            "close": close,
+            "predicted_high": {h: float(highs[h - 1]) for h in range(1, FORECAST_MAX_HORIZON + 1)},
+            "predicted_gain": {h: float((highs[h - 1] - close) / close * 100) for h in range(1, FORECAST_MAX_HORIZON + 1)},
+        }
+
+    def forecast(self, tickers, horizons=None):
+        """{"forecasts": [...], "missing": [tickers with no model or too few bars]}, in request order."""
+        horizons = horizons or list(range(1, FORECAST_MAX_HORIZON + 1))
+        now = time.monotonic()
+        results = {}
+        missing = []
+
+        for ticker in dict.fromkeys(tickers):
+            with self._lock:
+                entry = self._forecasts.get(ticker)
+            if entry and now - entry[3] < self.check_interval:
+                results[ticker] = entry[0]
+                with self._lock:
+                    self._counts["hits"] += 1
+                continue
+
+            bars_mtime, model_mtime, model_path = self._files(ticker)
+            if bars_mtime is None or model_mtime is None:
+                missing.append(ticker)
+                with self._lock:
+                    self._counts["missing"] += 1
+                continue
+
+            if entry and entry[1] == bars_mtime and entry[2] == model_mtime:
+                # nothing new since it was computed
+                forecast, counter = entry[0], "hits"
+            else:
+                forecast, counter = self._compute(ticker, bars_mtime, model_mtime, model_path), "computed"
+                if forecast is None:
+                    missing.append(ticker)
+                    with self._lock:
+                        self._counts["missing"] += 1
+                    continue
+
+            with self._lock:
+                self._forecasts[ticker] = (forecast, bars_mtime, model_mtime, now)
+                self._counts[counter] += 1
+            results[ticker] = forecast
+
+        forecasts = []
+        for ticker, forecast in results.items():
+            forecasts.append({
+                "ticker": ticker,
+                "as_of": forecast["as_of"],
+                "close": forecast["close"],
+                "horizons": [
+                    {"days": h, "predicted_high": forecast["predicted_high"][h], "predicted_gain": forecast["predicted_gain"][h]}
+                    for h in horizons
+                ],
+            })
+        return {"forecasts": forecasts, "missing": missing}
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, models=len(self._boosters), forecasts=len(self._forecasts))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """The process-wide registry, created on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ForecastRegistry()
+    return _registry
@@ -0,0 +1,34 @@
+# Production server settings, used as: gunicorn -c gunicorn.conf.py app:app
+import multiprocessing
+import os
+
+# PORT in the backend .env is the database port, so the web port has its own variable
+bind = f"0.0.0.0:{os.getenv('WEB_PORT', 5000)}"
+
+# pre-forked workers, each with its own connection pool, price cache and suggestion index
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# threads per worker, keep DB_POOL_MAX at least this high so a thread never waits on the pool
+threads = int(os.getenv('WEB_THREADS', 4))
+
+# import app.py once in the master and fork the workers from it, so startup cost is paid once
+# and the imported modules' pages are shared copy-on-write. Nothing at import opens a
+# connection or a thread, the pool and the caches start empty in every worker.
+preload_app = True
+
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    # samples left by a previous server would be added to the new ones
+    import metrics
+    metrics.reset()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.process_exited(worker.pid)
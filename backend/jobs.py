@@ -0,0 +1,172 @@
+import multiprocessing
+import os
+import threading
+
+import psycopg2
+
+import db
+
+# job states stored in AIJob.status
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# a running job that has not reported progress for this long is assumed to have died
+STALE_AFTER_MINUTES = int(os.getenv('AI_JOB_STALE_MINUTES', 30))
+
+JOB_COLUMNS = ["job_ID", "status", "stage", "total", "done", "failed", "cancel_requested",
+               "error", "created_at", "started_at", "finished_at"]
+
+
+class JobCancelled(Exception):
+    """Raised from the progress callback to stop a refresh that was cancelled."""
+
+
+def get_active_job(conn):
+    """The queued or running refresh job, if there is one."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT job_ID FROM AIJob WHERE status = ANY(%s) ORDER BY job_ID DESC LIMIT 1", (list(ACTIVE_STATES),))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def create_job(conn):
+    """Record a new queued refresh job, first failing active jobs that stopped reporting progress.
+
+    Returns the job id, or None if another refresh is already queued or running.
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE AIJob SET status = %s, stage = %s, error = %s, finished_at = now(), updated_at = now()
+                WHERE status = ANY(%s) AND updated_at < now() - make_interval(mins => %s)
+            """, (FAILED, FAILED, "worker stopped reporting progress", list(ACTIVE_STATES), STALE_AFTER_MINUTES))
+            # the partial unique index on active jobs makes this fail if one is already queued or running
+            cur.execute("INSERT INTO AIJob (status, stage) VALUES (%s, %s) RETURNING job_ID", (QUEUED, QUEUED))
+            job_id = cur.fetchone()[0]
+        conn.commit()
+    except psycopg2.errors.UniqueViolation:
+        conn.rollback()
+        return None
+    return job_id
+
+
+def enqueue_refresh(conn, workers=None, budget_s=None):
+    """Record a new refresh job and start it in a separate worker process.
+
+    With budget_s only the stale tickers that fit in that many seconds are refreshed (refresh_planner).
+    Returns the job id, or None if another refresh is already queued or running.
+    """
+    job_id = create_job(conn)
+    if job_id is None:
+        return None
+
+    # spawn a fresh interpreter so the web worker's threads, sockets and pool are not inherited
+    process = multiprocessing.get_context("spawn").Process(target=run_job, args=(job_id, workers, budget_s), name=f"ai-job-{job_id}")
+    process.start()
+    # reap the process when it exits so finished jobs do not linger as zombies
+    threading.Thread(target=process.join, daemon=True).start()
+
+    return job_id
+
+
+def get_job(conn, job_id):
+    """Status of a job with elapsed time and ETA, or None if it does not exist."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {', '.join(JOB_COLUMNS)}, now() FROM AIJob WHERE job_ID = %s", (job_id,))
+        row = cur.fetchone()
+    if not row:
+        return None
+
+    job = dict(zip(JOB_COLUMNS, row[:-1]))
+    now = row[-1]
+
+    elapsed = None
+    eta = None
+    if job["started_at"]:
+        elapsed = ((job["finished_at"] or now) - job["started_at"]).total_seconds()
+        finished = (job["done"] or 0) + (job["failed"] or 0)
+        if job["status"] == RUNNING and job["total"] and finished:
+            eta = elapsed / finished * (job["total"] - finished)
+
+    job["elapsed_s"] = elapsed
+    job["eta_s"] = eta
+    for column in ("created_at", "started_at", "finished_at"):
+        job[column] = job[column].isoformat() if job[column] else None
+    return job
+
+
+def request_cancel(conn, job_id):
+    """Ask a job to stop. A queued job is cancelled right away, a running one at its next ticker.
+
+    Returns False if the job does not exist or has already finished.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE AIJob
+            SET cancel_requested = TRUE,
+                status = CASE WHEN status = %s THEN %s ELSE status END,
+                finished_at = CASE WHEN status = %s THEN now() ELSE finished_at END,
+                updated_at = now()
+            WHERE job_ID = %s AND status = ANY(%s)
+            RETURNING job_ID
+        """, (QUEUED, CANCELLED, QUEUED, job_id, list(ACTIVE_STATES)))
+        updated = cur.fetchone()
+    conn.commit()
+    return updated is not None
+
+
+def run_job(job_id, workers=None, budget_s=None):
+    """Entry point of the worker process: run StockAI.main_ai, or a planned refresh, and record its progress."""
+    # the ML stack is only ever imported in the worker process
+    import refresh_planner
+    import StockAI
+
+    conn = db.connect()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE AIJob SET status = %s, stage = %s, started_at = now(), updated_at = now(), worker_pid = %s
+                WHERE job_ID = %s AND status = %s
+                RETURNING job_ID
+            """, (RUNNING, "starting", os.getpid(), job_id, QUEUED))
+            if cur.fetchone() is None:
+                # cancelled before the worker got to it
+                return
+
+        def progress(stage, done, failed, total):
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE AIJob SET stage = %s, done = %s, failed = %s, total = %s, updated_at = now()
+                    WHERE job_ID = %s
+                    RETURNING cancel_requested
+                """, (stage, done, failed, total, job_id))
+                cancel_requested = cur.fetchone()[0]
+            if cancel_requested:
+                raise JobCancelled()
+
+        try:
+            if budget_s is None:
+                StockAI.main_ai(workers=workers, progress=progress)
+            else:
+                refresh_planner.run_planned(workers, budget_s, progress=progress)
+            status, error = SUCCEEDED, None
+        except JobCancelled:
+            status, error = CANCELLED, None
+        except Exception as e:
+            status, error = FAILED, str(e)
+
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE AIJob SET status = %s, stage = %s, error = %s, finished_at = now(), updated_at = now()
+                WHERE job_ID = %s
+            """, (status, status, error, job_id))
+        print(f"AI job {job_id} finished: {status}")
+    finally:
+        conn.close()
+
@@ -0,0 +1,100 @@
+"""Resident memory of this process and per-stage allocation of an AI refresh.
+
+RSS and peak RSS come from /proc/self/status on Linux (VmRSS, VmHWM), with
+resource.getrusage as the fallback elsewhere. Allocation per stage comes from tracemalloc,
+which numpy and pandas buffers report to; tracing slows the run down, so it is opt-in.
+"""
+import resource
+import sys
+import tracemalloc
+from contextlib import contextmanager
+
+MB = 1024 * 1024
+
+
+def _status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _maxrss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+
+def rss_mb():
+    """Current resident set size, the peak so far where the current one is not available."""
+    current = _status_mb("VmRSS")
+    return current if current is not None else _maxrss_mb()
+
+
+def peak_rss_mb():
+    """Highest resident set size of the process so far."""
+    peak = _status_mb("VmHWM")
+    return peak if peak is not None else _maxrss_mb()
+
+
+def reset_peak_rss():
+    """Reset the peak RSS to the current RSS, so peak_rss_mb() covers only what runs next.
+
+    Writing 5 to /proc/self/clear_refs resets VmHWM on Linux; returns False where it cannot.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageMemory:
+    """RSS growth and, with trace=True, peak traced allocation of each named stage.
+
+    Use as `with memory.stage("prepare"): ...`; a stage entered many times reports its
+    largest values, i.e. what one ticker or chunk of that stage needs at most.
+    """
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.stages = {}
+        self._started_tracing = False
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    @contextmanager
+    def stage(self, name):
+        before = rss_mb()
+        if self.trace:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {"calls": 0, "max_rss_growth_mb": 0.0, "max_alloc_mb": None})
+            entry["calls"] += 1
+            entry["max_rss_growth_mb"] = max(entry["max_rss_growth_mb"], rss_mb() - before)
+            if self.trace:
+                allocated = (tracemalloc.get_traced_memory()[1] - traced_before) / MB
+                entry["max_alloc_mb"] = max(entry["max_alloc_mb"] or 0.0, allocated)
+
+    def summary(self):
+        return {
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "stages": {
+                name: {key: round(value, 2) if isinstance(value, float) else value for key, value in entry.items()}
+                for name, entry in self.stages.items()
+            },
+        }
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
@@ -0,0 +1,146 @@
+import os
+import shutil
+import sys
+import time
+
+# every process (gunicorn workers, AI refresh workers) writes its samples to this directory
+# and /metrics adds them up. It has to be set before prometheus_client is imported.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "metrics")
+)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to build a response, by route template.",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUESTS = Counter("http_requests_total", "Responses sent, by route template and status.", ["method", "route", "status"])
+
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Time spent in cursor.execute, by call site (module:function).",
+    ["site"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+)
+
+STAGE_LATENCY = Histogram(
+    "stockai_stage_duration_seconds", "Per-ticker time of each AI refresh stage (write is once per run).",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+TICKERS = Counter("stockai_tickers_total", "Tickers processed by AI refreshes, by result.", ["result"])
+LAST_REFRESH = Gauge(
+    "stockai_last_success_timestamp_seconds", "Unix time the last successful AI refresh finished.",
+    multiprocess_mode="max"
+)
+
+# frames from these modules are skipped when looking for the code that ran a query
+_WRAPPER_MODULES = {__name__, "psycopg2.extras", "psycopg2.extensions", "contextlib"}
+
+
+def reset():
+    """Empty the samples directory, once at server start before any worker exists."""
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def process_exited(pid):
+    """Drop the live gauges of a worker process that exited (gunicorn child_exit)."""
+    multiprocess.mark_process_dead(pid)
+
+
+def exposition():
+    """(body, content type) of /metrics: the samples of every process in Prometheus text format."""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_app(app):
+    """Time every request and count responses by route template and status."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            # the URL rule, not the path, so /api/portfolio/<int:entry_id> is one series
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_LATENCY.labels(request.method, route).observe(time.perf_counter() - start)
+            REQUESTS.labels(request.method, route, str(response.status_code)).inc()
+        return response
+
+
+def _call_site():
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__") in _WRAPPER_MODULES:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    return f"{frame.f_globals.get('__name__')}:{frame.f_code.co_name}"
+
+
+class _TimedCursorMixin:
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            QUERY_LATENCY.labels(_call_site()).observe(time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            QUERY_LATENCY.labels(_call_site()).observe(time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            QUERY_LATENCY.labels(_call_site()).observe(time.perf_counter() - start)
+
+
+_timed_cursor_classes = {}
+
+
+def _timed(cursor_class):
+    timed = _timed_cursor_classes.get(cursor_class)
+    if timed is None:
+        timed = type(f"Timed{cursor_class.__name__}", (_TimedCursorMixin, cursor_class), {})
+        _timed_cursor_classes[cursor_class] = timed
+    return timed
+
+
+def timed_connection_factory():
+    """psycopg2 connection class whose cursors, of any cursor_factory, time every statement."""
+    from psycopg2 import extensions
+
+    class TimedConnection(extensions.connection):
+        def cursor(self, *args, **kwargs):
+            kwargs["cursor_factory"] = _timed(kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor)
+            return super().cursor(*args, **kwargs)
+
+    return TimedConnection
+
+
+def record_refresh(stage_spans, completed, failed):
+    """Publish a finished AI refresh: per-ticker stage durations, ticker counts and the time it finished."""
+    for stage, spans in stage_spans.items():
+        for start, end in spans:
+            STAGE_LATENCY.labels(stage).observe(end - start)
+    TICKERS.labels("ok").inc(completed)
+    TICKERS.labels("failed").inc(failed)
+    LAST_REFRESH.set(time.time())
@@ -0,0 +1,340 @@
+from psycopg2 import extensions
+
+
+class Migration:
+    """A numbered schema change, applied at most once and recorded in SchemaMigrations.
+
+    The statements of a migration run in one transaction. Migrations built with
+    concurrent_indexes instead run each CREATE INDEX CONCURRENTLY on its own, outside a
+    transaction, so the tables stay writable while the index builds.
+    """
+
+    def __init__(self, version, name, statements=(), concurrent_indexes=()):
+        self.version = version
+        self.name = name
+        self.statements = list(statements)
+        # (index name, CREATE INDEX CONCURRENTLY IF NOT EXISTS ...) pairs
+        self.concurrent_indexes = list(concurrent_indexes)
+
+
+MIGRATIONS = [
+    Migration(1, "initial_schema", [
+        """
+        CREATE TABLE IF NOT EXISTS AccountUser (
+            user_ID SERIAL PRIMARY KEY,
+            first_name VARCHAR(100) NOT NULL,
+            last_name VARCHAR(100) NOT NULL,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Industry (
+            industry_ID SERIAL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS StockPool (
+            stock_ID SERIAL PRIMARY KEY,
+            ticker_symbol VARCHAR(50) UNIQUE NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            path TEXT
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS StockEntry (
+            entry_ID SERIAL PRIMARY KEY,
+            user_ID INT NOT NULL,
+            Industry_ID INT NOT NULL,
+            stock VARCHAR(255) NOT NULL,
+            number INT NOT NULL,
+            date DATE NOT NULL,
+            price_per_share DECIMAL(10,2) NOT NULL,
+            FOREIGN KEY (user_ID) REFERENCES AccountUser(user_ID) ON DELETE CASCADE,
+            FOREIGN KEY (Industry_ID) REFERENCES Industry(industry_ID) ON DELETE CASCADE
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS AISuggestions (
+            suggestion_ID SERIAL PRIMARY KEY,
+            Industry_ID INT NOT NULL,
+            stock_ID INT NOT NULL,
+            Rating DECIMAL(3,2) NOT NULL,
+            FOREIGN KEY (stock_ID) REFERENCES StockPool(stock_ID) ON DELETE CASCADE,
+            FOREIGN KEY (Industry_ID) REFERENCES Industry(industry_ID) ON DELETE CASCADE 
+        );
+        """
+    ]),
+    Migration(2, "ai_jobs", [
+        """
+        CREATE TABLE IF NOT EXISTS AIJob (
+            job_ID SERIAL PRIMARY KEY,
+            status VARCHAR(20) NOT NULL,
+            stage VARCHAR(50),
+            total INT NOT NULL DEFAULT 0,
+            done INT NOT NULL DEFAULT 0,
+            failed INT NOT NULL DEFAULT 0,
+            cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+            error TEXT,
+            worker_pid INT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            started_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            finished_at TIMESTAMPTZ
+        );
+        """,
+        """
+        -- at most one refresh job can be queued or running at a time
+        CREATE UNIQUE INDEX IF NOT EXISTS aijob_one_active
+        ON AIJob ((TRUE)) WHERE status IN ('queued', 'running');
+        """
+    ]),
+    Migration(3, "suggestions_version", [
+        """
+        -- single row, bumped on every write that changes the suggestion rankings
+        CREATE TABLE IF NOT EXISTS AISuggestionsVersion (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            version BIGINT NOT NULL DEFAULT 0
+        );
+        INSERT INTO AISuggestionsVersion (id, version) VALUES (TRUE, 0) ON CONFLICT (id) DO NOTHING;
+        """,
+        """
+        CREATE OR REPLACE FUNCTION bump_ai_suggestions_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE AISuggestionsVersion SET version = version + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS aisuggestions_version ON AISuggestions;
+        CREATE TRIGGER aisuggestions_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON AISuggestions
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_ai_suggestions_version();
+
+        DROP TRIGGER IF EXISTS stockpool_suggestions_version ON StockPool;
+        CREATE TRIGGER stockpool_suggestions_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON StockPool
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_ai_suggestions_version();
+
+        DROP TRIGGER IF EXISTS industry_suggestions_version ON Industry;
+        CREATE TRIGGER industry_suggestions_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Industry
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_ai_suggestions_version();
+        """
+    ]),
+    Migration(4, "aisuggestions_unique_stock", [
+        """
+        -- ON CONFLICT (stock_ID) needs a unique index, keep only the newest suggestion per stock first
+        DELETE FROM AISuggestions a
+        USING AISuggestions b
+        WHERE a.stock_ID = b.stock_ID AND a.suggestion_ID < b.suggestion_ID;
+        """
+    ]),
+    Migration(5, "hot_query_indexes", concurrent_indexes=[
+        ("aisuggestions_stock_id_key",
+         "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS aisuggestions_stock_id_key ON AISuggestions (stock_ID)"),
+        # /api/portfolio: WHERE user_ID = %s ORDER BY entry_ID
+        ("stockentry_user_entry_idx",
+         "CREATE INDEX CONCURRENTLY IF NOT EXISTS stockentry_user_entry_idx ON StockEntry (user_ID, entry_ID)"),
+        # /api/suggestions holdings: the user's stocks and their industries without touching the heap
+        ("stockentry_user_stock_idx",
+         "CREATE INDEX CONCURRENTLY IF NOT EXISTS stockentry_user_stock_idx ON StockEntry (user_ID, stock) INCLUDE (Industry_ID)"),
+        # top-rated stocks per industry
+        ("aisuggestions_industry_rating_idx",
+         "CREATE INDEX CONCURRENTLY IF NOT EXISTS aisuggestions_industry_rating_idx ON AISuggestions (Industry_ID, Rating DESC)"),
+    ]),
+    Migration(6, "portfolio_version", [
+        """
+        -- one row per user, bumped on every write to their lots, the ETag of /api/portfolio
+        CREATE TABLE IF NOT EXISTS PortfolioVersion (
+            user_ID INT PRIMARY KEY REFERENCES AccountUser(user_ID) ON DELETE CASCADE,
+            version BIGINT NOT NULL DEFAULT 0
+        );
+        """,
+        """
+        CREATE OR REPLACE FUNCTION bump_portfolio_version() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO PortfolioVersion (user_ID, version) VALUES (OLD.user_ID, 1)
+                ON CONFLICT (user_ID) DO UPDATE SET version = PortfolioVersion.version + 1;
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.user_ID IS DISTINCT FROM OLD.user_ID) THEN
+                INSERT INTO PortfolioVersion (user_ID, version) VALUES (NEW.user_ID, 1)
+                ON CONFLICT (user_ID) DO UPDATE SET version = PortfolioVersion.version + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS stockentry_portfolio_version ON StockEntry;
+        CREATE TRIGGER stockentry_portfolio_version
+        AFTER INSERT OR UPDATE OR DELETE ON StockEntry
+        FOR EACH ROW EXECUTE FUNCTION bump_portfolio_version();
+
+        -- the portfolio shows industry names, renaming one changes every portfolio
+        CREATE OR REPLACE FUNCTION bump_all_portfolio_versions() RETURNS trigger AS $$
+        BEGIN
+            UPDATE PortfolioVersion SET version = version + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS industry_portfolio_version ON Industry;
+        CREATE TRIGGER industry_portfolio_version
+        AFTER UPDATE OR DELETE OR TRUNCATE ON Industry
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_all_portfolio_versions();
+        """
+    ]),
+    Migration(7, "stock_refresh_state", [
+        """
+        -- what the last AI refresh saw and produced for each stock, read by refresh_planner
+        CREATE TABLE IF NOT EXISTS StockRefreshState (
+            stock_ID INT PRIMARY KEY REFERENCES StockPool(stock_ID) ON DELETE CASCADE,
+            last_bar_date DATE,
+            data_hash TEXT,
+            last_trained_at TIMESTAMPTZ,
+            predicted_gain DOUBLE PRECISION,
+            duration_s DOUBLE PRECISION,
+            last_error TEXT,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """
+    ]),
+]
+
+
+def _ensure_migrations_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS SchemaMigrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+    conn.commit()
+
+
+def applied_versions(conn):
+    _ensure_migrations_table(conn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM SchemaMigrations")
+        versions = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return versions
+
+
+def _drop_invalid_index(conn, index_name):
+    """A failed CREATE INDEX CONCURRENTLY leaves an invalid index behind, drop it so the build can be retried."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s AND NOT i.indisvalid
+        """, (index_name,))
+        if cur.fetchone():
+            print(f"Dropping invalid index {index_name} left by an earlier run")
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+
+def _apply(conn, migration):
+    if migration.concurrent_indexes:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        try:
+            for index_name, statement in migration.concurrent_indexes:
+                _drop_invalid_index(conn, index_name)
+                with conn.cursor() as cur:
+                    cur.execute(statement)
+        finally:
+            conn.autocommit = False
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO SchemaMigrations (version, name) VALUES (%s, %s)", (migration.version, migration.name))
+        conn.commit()
+        return
+
+    try:
+        with conn.cursor() as cur:
+            for statement in migration.statements:
+                cur.execute(statement)
+            cur.execute("INSERT INTO SchemaMigrations (version, name) VALUES (%s, %s)", (migration.version, migration.name))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def migrate(conn, target=None):
+    """Apply every migration newer than the database, in order. Returns the versions applied."""
+    done = applied_versions(conn)
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done or (target is not None and migration.version > target):
+            continue
+        print(f"Applying migration {migration.version:04d} {migration.name}...")
+        _apply(conn, migration)
+        applied.append(migration.version)
+    if not applied:
+        print("Database schema is up to date.")
+    return applied
+
+
+# hot queries and the indexes their plans are expected to use, checked with EXPLAIN
+HOT_QUERY_PLANS = [
+    ("portfolio",
+     "SELECT s.entry_ID, s.stock, i.name, s.number, s.price_per_share, s.date FROM StockEntry s "
+     "INNER JOIN Industry i ON s.industry_ID = i.industry_ID WHERE user_ID = 1 ORDER BY entry_ID",
+     {"stockentry_user_entry_idx"}),
+    ("portfolio page",
+     "SELECT s.entry_ID, s.stock, i.name, s.number, s.price_per_share, s.date FROM StockEntry s "
+     "INNER JOIN Industry i ON s.industry_ID = i.industry_ID WHERE s.user_ID = 1 AND s.entry_ID > 0 "
+     "ORDER BY s.entry_ID LIMIT 51",
+     {"stockentry_user_entry_idx"}),
+    ("suggestion holdings",
+     "SELECT v.version, s.stock, s.industry_ID FROM AISuggestionsVersion v LEFT JOIN StockEntry s ON s.user_ID = 1",
+     {"stockentry_user_stock_idx", "stockentry_user_entry_idx"}),
+    ("top rated per industry",
+     "SELECT stock_ID, Rating FROM AISuggestions WHERE Industry_ID = 1 ORDER BY Rating DESC LIMIT 3",
+     {"aisuggestions_industry_rating_idx"}),
+    ("ratings upsert",
+     "INSERT INTO AISuggestions (Industry_ID, stock_ID, Rating) VALUES (1, 1, 0) "
+     "ON CONFLICT (stock_ID) DO UPDATE SET Rating = EXCLUDED.Rating",
+     {"aisuggestions_stock_id_key"}),
+]
+
+
+def _plan_indexes(plan):
+    """Every index named anywhere in an EXPLAIN (FORMAT JSON) plan, including ON CONFLICT arbiters."""
+    found = set()
+    if isinstance(plan, dict):
+        if "Index Name" in plan:
+            found.add(plan["Index Name"])
+        found.update(plan.get("Conflict Arbiter Indexes", []))
+        for value in plan.values():
+            found |= _plan_indexes(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            found |= _plan_indexes(value)
+    return found
+
+
+def check_hot_query_plans(conn):
+    """EXPLAIN each hot query and check that it can use its index. Returns a list of (name, ok, indexes used).
+
+    Sequential scans are disabled for the check: on a small or freshly seeded database the
+    planner rightly prefers them, and the question here is whether the index is usable.
+    """
+    results = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+            for name, query, expected in HOT_QUERY_PLANS:
+                cur.execute("EXPLAIN (FORMAT JSON) " + query)
+                plan = cur.fetchone()[0]
+                used = _plan_indexes(plan)
+                results.append((name, bool(used & expected), sorted(used)))
+    finally:
+        # nothing is executed by EXPLAIN, roll back to drop the SET LOCAL
+        if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    return results
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+MODEL_STORE_DIR = os.getenv('MODEL_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "models"))
+
+# outcomes of a train_model call, counted per run
+HIT = "hit"    # training data unchanged, stored prediction reused
+WARM = "warm"  # only new bars, boosting continued from the stored booster
+MISS = "miss"  # trained from scratch
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_arrays(*arrays):
+    """Content hash of the training data, stable across runs and processes."""
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.dtype).encode())
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+class ModelStore:
+    """Trained boosters and their metadata on disk, one pair of files per ticker.
+
+    The metadata records the feature-set version, model parameters and hashes of the data
+    the booster was trained on, so train_model can tell whether the data is unchanged,
+    only extended by new bars, or different.
+    """
+
+    def __init__(self, root=MODEL_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _paths(self, ticker):
+        return os.path.join(self.root, f"{ticker}.ubj"), os.path.join(self.root, f"{ticker}.json")
+
+    def metadata(self, ticker):
+        """The stored metadata, or None if there is none or it does not belong to the stored booster."""
+        model_path, meta_path = self._paths(ticker)
+        if not os.path.exists(meta_path) or not os.path.exists(model_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        # a save interrupted between its two renames leaves the new metadata with the old booster
+        if meta.get("booster_hash") != _hash_file(model_path):
+            return None
+        return meta
+
+    def booster_path(self, ticker):
+        model_path, _ = self._paths(ticker)
+        return model_path if os.path.exists(model_path) else None
+
+    def discard(self, ticker):
+        """Remove a ticker's booster and metadata, if any; the booster goes first so readers see it missing."""
+        for path in self._paths(ticker):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def save(self, ticker, model, meta):
+        """Store a fitted XGBRegressor (or Booster) and its metadata, replacing any previous one."""
+        model_path, meta_path = self._paths(ticker)
+        # temporary files first so a crash never leaves half a file; the metadata records the
+        # booster's hash, so metadata() rejects a pair left mismatched by a crash between the renames
+        model.save_model(model_path + ".tmp.ubj")
+        meta = dict(meta, booster_hash=_hash_file(model_path + ".tmp.ubj"))
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        os.replace(model_path + ".tmp.ubj", model_path)
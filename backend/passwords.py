@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import bcrypt
+
+# bcrypt work factor for new hashes, stored hashes with another cost are rehashed on login
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+# threads that hash, bcrypt releases the GIL so they run beside the request threads
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', 2))
+# hashes that may be running or waiting at once, beyond that requests are turned away
+HASH_MAX_PENDING = int(os.getenv('HASH_MAX_PENDING', 32))
+# seconds a request waits for its hash before giving up
+HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', 10))
+
+
+class HasherBusy(Exception):
+    """Raised when HASH_MAX_PENDING hashes are already queued or a hash waits past HASH_TIMEOUT, answer 503."""
+
+
+def hash_cost(hashed):
+    """Work factor of a stored bcrypt hash ($2b$12$... -> 12), None if it is not a bcrypt hash."""
+    parts = hashed.split("$")
+    return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else None
+
+
+class PasswordHasher:
+    """bcrypt on a small dedicated thread pool with a bounded queue.
+
+    A login burst then queues here instead of occupying every request thread, the rest of
+    the API keeps its threads, and once the queue is full further logins get a fast 503
+    instead of piling up. stats() reports queue depth and wait/hash times.
+    """
+
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING, timeout=HASH_TIMEOUT):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._counts = {"hashes": 0, "rejected": 0, "timeouts": 0, "rehashed": 0}
+        self._wait_total = 0.0
+        self._hash_total = 0.0
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counts["rejected"] += 1
+            raise HasherBusy("Too many logins in progress, try again shortly")
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def run():
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_total += started - submitted
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._counts["hashes"] += 1
+                    self._hash_total += time.perf_counter() - started
+                self._slots.release()
+
+        return self._executor.submit(run)
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self._counts["timeouts"] += 1
+            # the hash keeps its slot until it finishes, to the caller this is the same overload
+            raise HasherBusy("Password hashing timed out") from None
+
+    def hash(self, password):
+        """New bcrypt hash of a password, as the str stored in AccountUser.password."""
+        future = self._submit(lambda: bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(self.rounds)).decode("utf-8"))
+        return self._result(future)
+
+    def check(self, hashed, password):
+        """True if the password matches the stored hash."""
+        future = self._submit(lambda: bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8")))
+        return self._result(future)
+
+    def needs_rehash(self, hashed):
+        return hash_cost(hashed) != self.rounds
+
+    def rehash_in_background(self, password, store):
+        """Hash the password at the current work factor and pass it to store(new_hash), off the request.
+
+        Skipped if the queue is full, the next login tries again.
+        """
+        def rehash():
+            new_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(self.rounds)).decode("utf-8")
+            store(new_hash)
+            with self._lock:
+                self._counts["rehashed"] += 1
+
+        try:
+            future = self._submit(rehash)
+        except HasherBusy:
+            return
+        future.add_done_callback(_log_rehash_failure)
+
+    def stats(self):
+        with self._lock:
+            hashes = self._counts["hashes"]
+            return dict(
+                self._counts,
+                rounds=self.rounds,
+                queued=self._queued,
+                running=self._running,
+                wait_avg_ms=round(self._wait_total / hashes * 1000, 2) if hashes else 0.0,
+                hash_avg_ms=round(self._hash_total / hashes * 1000, 2) if hashes else 0.0,
+            )
+
+
+def _log_rehash_failure(future):
+    if future.exception() is not None:
+        print(f"Password rehash failed: {future.exception()}")
@@ -0,0 +1,105 @@
+"""One gradient-boosted model over every ticker, the alternative to a model per stock.
+
+The features are scale-free (moving averages and lagged highs relative to the close,
+trailing returns, volatility), so a $5 and a $500 stock share the same trees, and the
+ticker and its industry are categorical features. The target is the high 5 bars ahead
+relative to today's close, so a prediction turns back into a predicted high and gain.
+Training uses XGBoost's histogram method on a QuantileDMatrix, which bins the features
+once, with an explicit thread budget; the whole universe is predicted in one call.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import features
+
+# XGBoost threads of a pooled fit, the whole machine by default since there is only one fit
+POOLED_THREADS = int(os.getenv('POOLED_THREADS', os.cpu_count() or 1))
+POOLED_ROUNDS = int(os.getenv('POOLED_ROUNDS', 300))
+POOLED_PARAMS = {
+    "objective": "reg:squarederror",
+    "tree_method": "hist",
+    "max_bin": 256,
+    "learning_rate": 0.05,
+    "max_depth": 6,
+    "subsample": 0.7,
+    "colsample_bytree": 0.8,
+    "reg_lambda": 2,
+    "reg_alpha": 1,
+    # partition-based splits on the categories, one-hot would be one column per ticker
+    "max_cat_to_onehot": 1,
+}
+
+# rows of each ticker held out at the end for evaluation, as train_model's 80/20 split
+TEST_FRACTION = 0.2
+# industry code of a ticker nobody holds, so it has no industry yet
+UNKNOWN_INDUSTRY = -1
+
+
+def design_matrix(panel, industries=None):
+    """(X, y, close) of a features.build_feature_panel frame.
+
+    X is a float32 frame of the relative features plus categorical "ticker" and "industry"
+    columns; y is Future_High / Close - 1. industries maps ticker to industry_ID.
+    """
+    close = panel["Close"].to_numpy(dtype=np.float64)
+    columns = {}
+    for window in features.MA_WINDOWS:
+        columns[f"MA{window}_rel"] = panel[f"MA{window}"].to_numpy(dtype=np.float64) / close - 1
+    for lag in features.LAGS:
+        columns[f"High_lag{lag}_rel"] = panel[f"High_lag{lag}"].to_numpy(dtype=np.float64) / close - 1
+        columns[f"Return_{lag}d"] = panel[f"Return_{lag}d"].to_numpy(dtype=np.float64)
+    for window in features.VOLATILITY_WINDOWS:
+        columns[f"Volatility_{window}d"] = panel[f"Volatility_{window}d"].to_numpy(dtype=np.float64)
+    X = pd.DataFrame({name: values.astype(np.float32) for name, values in columns.items()})
+
+    tickers = panel.index.get_level_values("Ticker")
+    X["ticker"] = pd.Categorical(tickers)
+    industry = np.full(len(panel), UNKNOWN_INDUSTRY, dtype=np.int64)
+    if industries:
+        industry = pd.Series(tickers).map(industries).fillna(UNKNOWN_INDUSTRY).to_numpy(dtype=np.int64)
+    X["industry"] = pd.Categorical(industry)
+
+    y = panel["Future_High"].to_numpy(dtype=np.float64) / close - 1
+    return X, y, close
+
+
+def split_rows(panel, test_fraction=TEST_FRACTION):
+    """(train mask, last-row mask): each ticker's first rows train, its final row is the one rated."""
+    tickers = panel.index.get_level_values("Ticker")
+    position = panel.groupby(level="Ticker", sort=False).cumcount().to_numpy()
+    size = pd.Series(tickers).map(pd.Series(tickers).value_counts()).to_numpy()
+    n_train = size - np.ceil(size * test_fraction).astype(np.int64)
+    return position < n_train, position == size - 1
+
+
+def train_pooled(panel, industries=None, params=None, rounds=POOLED_ROUNDS, n_threads=POOLED_THREADS):
+    """Fit one booster on every ticker's training rows and predict all held-out rows in one call.
+
+    Returns {"booster", "gains": {ticker: predicted gain in percent}, "y_true", "y_pred", "close"},
+    the last three over the held-out rows in price terms, for train_model-style metrics.
+    """
+    import xgboost as xgb
+
+    params = {**POOLED_PARAMS, **(params or {}), "nthread": n_threads}
+    X, y, close = design_matrix(panel, industries)
+    train, last = split_rows(panel)
+
+    dtrain = xgb.QuantileDMatrix(X[train], y[train], enable_categorical=True, max_bin=params["max_bin"], nthread=n_threads)
+    booster = xgb.train(params, dtrain, num_boost_round=rounds)
+    del dtrain
+
+    # every ticker's final row is in its held-out tail, so one predict covers metrics and ratings
+    test = ~train
+    predicted = booster.predict(xgb.DMatrix(X[test], enable_categorical=True, nthread=n_threads))
+    tickers = panel.index.get_level_values("Ticker")[test]
+    is_last = last[test]
+
+    return {
+        "booster": booster,
+        "gains": dict(zip(tickers[is_last], (predicted[is_last] * 100).astype(np.float64).tolist())),
+        "y_true": (y[test] + 1) * close[test],
+        "y_pred": (predicted.astype(np.float64) + 1) * close[test],
+        "close": close[test],
+    }
@@ -0,0 +1,88 @@
+import hashlib
+import os
+
+# columns of a portfolio lot, in the order the queries below select them
+COLUMNS = ["entry_ID", "stock", "name", "number", "price_per_share", "date"]
+
+# largest page a client may ask for with ?limit=
+PAGE_MAX = int(os.getenv('PORTFOLIO_PAGE_MAX', 500))
+# rows the server-side cursor pulls per round trip in stream mode
+STREAM_ITERSIZE = int(os.getenv('PORTFOLIO_STREAM_ITERSIZE', 500))
+
+# keyset on entry_ID, served by stockentry_user_entry_idx (user_ID, entry_ID)
+LOTS_QUERY = """
+    SELECT s.entry_ID, s.stock, i.name, s.number, s.price_per_share, s.date
+    FROM StockEntry s
+    INNER JOIN Industry i ON s.industry_ID = i.industry_ID
+    WHERE s.user_ID = %s AND s.entry_ID > %s
+    ORDER BY s.entry_ID
+"""
+
+
+def get_version(cur, user_id):
+    """The user's portfolio version, bumped by a trigger on every write to their lots."""
+    cur.execute("SELECT version FROM PortfolioVersion WHERE user_ID = %s", (user_id,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def etag(user_id, version, *params):
+    """Strong (unquoted) ETag of one portfolio representation: the user, their version and the request shape."""
+    shape = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+    return f"p{user_id}-{version}-{shape}"
+
+
+def page_params(args):
+    """(error, after, limit) from ?after= and ?limit=, shared by app.py and async_app.py.
+
+    error is the 400 message of a non-integer or out-of-range value, None when both are valid.
+    """
+    try:
+        after = int(args.get("after", 0))
+    except (TypeError, ValueError):
+        return "after must be an integer", None, None
+    if after < 0:
+        return "after must be a non-negative entry_ID", None, None
+
+    limit = args.get("limit")
+    if limit is None:
+        return None, after, None
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return "limit must be an integer", None, None
+    if not 1 <= limit <= PAGE_MAX:
+        return f"limit must be between 1 and {PAGE_MAX}", None, None
+    return None, after, limit
+
+
+def fetch_page(cur, user_id, after=0, limit=None):
+    """Lots with entry_ID > after, oldest first. Returns (lots, next_after).
+
+    next_after is the entry_ID to pass as ?after= for the next page, None on the last page.
+    Without a limit every remaining lot is returned.
+    """
+    if limit is None:
+        cur.execute(LOTS_QUERY, (user_id, after))
+        return [dict(zip(COLUMNS, row)) for row in cur.fetchall()], None
+
+    # one extra row tells whether another page follows
+    cur.execute(LOTS_QUERY + " LIMIT %s", (user_id, after, limit + 1))
+    lots = [dict(zip(COLUMNS, row)) for row in cur.fetchall()]
+    if len(lots) > limit:
+        return lots[:limit], lots[limit - 1]["entry_ID"]
+    return lots, None
+
+
+def stream_lots(conn, user_id, after=0, limit=None):
+    """Yield lots one at a time off a server-side cursor, so memory stays flat however many there are."""
+    query, params = LOTS_QUERY, (user_id, after)
+    if limit is not None:
+        query, params = query + " LIMIT %s", params + (limit,)
+
+    # a named cursor keeps the result set in PostgreSQL and fetches it STREAM_ITERSIZE rows at a time
+    with conn.cursor(name="portfolio_stream") as cur:
+        cur.itersize = STREAM_ITERSIZE
+        cur.execute(query, params)
+        for row in cur:
+            yield dict(zip(COLUMNS, row))
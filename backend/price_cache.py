@@ -0,0 +1,115 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# seconds a cached price is served as fresh
+PRICE_CACHE_TTL = float(os.getenv('PRICE_CACHE_TTL', 60))
+# seconds an expired price may still be served while a background refresh fetches a new one
+PRICE_CACHE_MAX_STALE = float(os.getenv('PRICE_CACHE_MAX_STALE', 600))
+
+
+def fetch_latest_prices(symbols):
+    """Latest close for each symbol from Yahoo Finance, all symbols in one batched download."""
+    # imported here so the web process only loads yfinance once a price is actually needed
+    import yfinance as yf
+
+    symbols = sorted(symbols)
+    data = yf.download(symbols, period="5d", interval="1d", progress=False, group_by="column")
+    if data.empty:
+        return {}
+
+    last = data["Close"].ffill().iloc[-1]
+    prices = {}
+    for symbol in symbols:
+        price = last.get(symbol)
+        if price is not None and math.isfinite(price):
+            prices[symbol] = float(price)
+    return prices
+
+
+class PriceCache:
+    """Shared latest-price cache with a TTL, background refresh and request coalescing.
+
+    A fresh price is served from memory. An expired one is still served (up to max_stale)
+    while a background thread refetches it. Symbols with no usable price are fetched in one
+    batched call for the whole request, and a request that needs a symbol another request
+    is already fetching waits for that fetch instead of starting its own.
+    """
+
+    def __init__(self, fetch=fetch_latest_prices, ttl=PRICE_CACHE_TTL, max_stale=PRICE_CACHE_MAX_STALE, timeout=15.0):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = {}   # symbol -> (price, fetched_at)
+        self._inflight = {}  # symbol -> Event set when its fetch finishes
+        self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="price-refresh")
+        self._counts = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "batches": 0, "fetch_errors": 0}
+
+    def get_many(self, symbols):
+        """{symbol: latest price} for the symbols that have one."""
+        now = time.monotonic()
+        prices = {}
+        to_fetch, to_refresh, to_wait = [], [], []
+
+        with self._lock:
+            for symbol in set(symbols):
+                entry = self._entries.get(symbol)
+                age = now - entry[1] if entry else None
+
+                if entry and age < self.ttl:
+                    prices[symbol] = entry[0]
+                    self._counts["hits"] += 1
+                elif entry and age < self.max_stale:
+                    prices[symbol] = entry[0]
+                    self._counts["stale_hits"] += 1
+                    if symbol not in self._inflight:
+                        self._inflight[symbol] = threading.Event()
+                        to_refresh.append(symbol)
+                elif symbol in self._inflight:
+                    to_wait.append((symbol, self._inflight[symbol]))
+                    self._counts["coalesced"] += 1
+                else:
+                    self._inflight[symbol] = threading.Event()
+                    to_fetch.append(symbol)
+                    self._counts["misses"] += 1
+
+        if to_refresh:
+            self._refresher.submit(self._load, to_refresh)
+        if to_fetch:
+            self._load(to_fetch)
+        for _, event in to_wait:
+            event.wait(self.timeout)
+
+        with self._lock:
+            for symbol in to_fetch + [symbol for symbol, _ in to_wait]:
+                entry = self._entries.get(symbol)
+                if entry:
+                    prices[symbol] = entry[0]
+        return prices
+
+    def _load(self, symbols):
+        try:
+            fetched = self._fetch(symbols)
+        except Exception as e:
+            print(f"Failed to fetch prices for {len(symbols)} symbols: {e}")
+            fetched = {}
+            with self._lock:
+                self._counts["fetch_errors"] += 1
+
+        now = time.monotonic()
+        with self._lock:
+            self._counts["batches"] += 1
+            for symbol in symbols:
+                if symbol in fetched:
+                    self._entries[symbol] = (fetched[symbol], now)
+                event = self._inflight.pop(symbol, None)
+                if event:
+                    event.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, symbols=len(self._entries), ttl_s=self.ttl)
@@ -0,0 +1,178 @@
+"""Downsampled daily price series for charts, read from the local price store.
+
+Sparklines and previews need a few hundred points at most, so a series is reduced with
+Largest-Triangle-Three-Buckets, which keeps the peaks and troughs a plain stride would skip.
+A ticker's bars are memoised until its Parquet file changes, and the file's mtime goes
+into the ETag, so a revalidation is answered without reading the bars again. A file
+with no rows counts as no prices at all.
+"""
+import hashlib
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import price_store
+
+# same rules as /api/addstock
+SYMBOL_PATTERN = r'^[A-Z0-9]{1,5}([.\-][A-Z0-9]{1,3})?$'
+# request field -> price store column
+FIELDS = {"close": "Close", "open": "Open", "high": "High", "low": "Low", "volume": "Volume"}
+FORMATS = ("json", "columns", "binary")
+
+PRICE_SERIES_DEFAULT_POINTS = 120
+PRICE_SERIES_MAX_POINTS = 5000
+# tickers one multi-ticker request may ask for
+PRICE_SERIES_MAX_TICKERS = int(os.getenv('PRICE_SERIES_MAX_TICKERS', 50))
+# seconds browsers and proxies may reuse a series without asking, bars change at most daily
+PRICE_SERIES_MAX_AGE = int(os.getenv('PRICE_SERIES_MAX_AGE', 300))
+# tickers whose bars are kept in memory per process
+PRICE_SERIES_CACHE_SIZE = int(os.getenv('PRICE_SERIES_CACHE_SIZE', 512))
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+DATE_ERROR = "start/end must be YYYY-MM-DD"
+
+
+def is_symbol(ticker):
+    return re.match(SYMBOL_PATTERN, ticker) is not None
+
+
+def lttb(x, y, threshold):
+    """Indices of the `threshold` points Largest-Triangle-Three-Buckets keeps, first and last included."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # bucket i spans [bounds[i], bounds[i + 1]), the first and last points are their own buckets
+    every = (n - 2) / (threshold - 2)
+    bounds = np.floor(np.arange(threshold - 1) * every).astype(np.int64) + 1
+    bounds[-1] = n - 1
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_start, next_end = (bounds[i + 1], bounds[i + 2]) if i + 2 < len(bounds) else (n - 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # twice the area of the triangle (last kept point, candidate, next bucket's average)
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+class SeriesStore:
+    """Per-process memo of tickers' bars as (days since epoch, {field: float array}), bounded LRU."""
+
+    def __init__(self, prices=None, max_entries=PRICE_SERIES_CACHE_SIZE):
+        self._prices = prices if prices is not None else price_store.PriceStore()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # ticker -> (mtime, days, columns)
+        self._counts = {"hits": 0, "loads": 0}
+
+    def version(self, ticker):
+        """mtime of the ticker's bars, None if the store has none or only a file with no rows."""
+        data_path, _ = self._prices._paths(ticker)
+        try:
+            mtime = os.stat(data_path).st_mtime_ns
+        except OSError:
+            return None
+
+        # an empty frame is as good as no file; the row count is read once per mtime
+        with self._lock:
+            entry = self._entries.get(ticker)
+        days = entry[1] if entry and entry[0] == mtime else self.bars(ticker, mtime)[0]
+        return mtime if len(days) else None
+
+    def bars(self, ticker, version):
+        """(days, columns) of a ticker at the given version."""
+        with self._lock:
+            entry = self._entries.get(ticker)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(ticker)
+                self._counts["hits"] += 1
+                return entry[1], entry[2]
+
+        frame = self._prices.read(ticker)
+        days = (frame.index.values.astype("datetime64[D]") - _EPOCH).astype(np.int32)
+        columns = {field: frame[column].to_numpy(dtype=np.float64) for field, column in FIELDS.items() if column in frame}
+        with self._lock:
+            self._entries[ticker] = (version, days, columns)
+            self._entries.move_to_end(ticker)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._counts["loads"] += 1
+        return days, columns
+
+    def series(self, ticker, version, field, points, start=None, end=None):
+        """(days, values) of one field between the start and end dates (inclusive), at most `points` long."""
+        days, columns = self.bars(ticker, version)
+        values = columns.get(field)
+        if values is None:
+            return days[:0], np.empty(0)
+
+        lo = np.searchsorted(days, to_day(start)) if start else 0
+        hi = np.searchsorted(days, to_day(end), side="right") if end else len(days)
+        days, values = days[lo:hi], values[lo:hi]
+        keep = np.isfinite(values)
+        days, values = days[keep], values[keep]
+
+        picked = lttb(days.astype(np.float64), values, points)
+        return days[picked], values[picked]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, tickers=len(self._entries))
+
+
+def to_day(iso_date):
+    """Days since 1970-01-01 of a YYYY-MM-DD date, raises ValueError if it is not one."""
+    if not re.fullmatch(r"\d{4}-\d{2}-\d{2}", iso_date):
+        raise ValueError(DATE_ERROR)
+    try:
+        day = np.datetime64(iso_date, "D")
+    except ValueError:
+        raise ValueError(DATE_ERROR) from None
+    return int((day - _EPOCH).astype(np.int64))
+
+
+def iso_dates(days):
+    return np.datetime_as_string(days.astype("datetime64[D]")).tolist()
+
+
+def etag(versions, *params):
+    """Tag of a response from the versions of the tickers' bars and the request parameters."""
+    return hashlib.sha1(repr((versions, params)).encode()).hexdigest()
+
+
+def as_rows(days, values):
+    return [{"date": day, "value": value} for day, value in zip(iso_dates(days), values.tolist())]
+
+
+def as_columns(days, values):
+    # parallel arrays: the keys are not repeated for every point
+    return {"dates": iso_dates(days), "values": values.tolist()}
+
+
+def as_binary(days, values):
+    """Little-endian uint32 point count, int32 days since 1970-01-01, then float32 values."""
+    return struct.pack("<I", len(days)) + days.astype("<i4").tobytes() + values.astype("<f4").tobytes()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide series store, created on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SeriesStore()
+    return _store
@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+
+# columns kept for every ticker, in the order yf.download returns them
+PRICE_COLUMNS = ["Close", "High", "Low", "Open", "Volume"]
+
+PRICE_CACHE_DIR = os.getenv('PRICE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "prices"))
+# "yahoo" downloads missing bars, "replay" reads them from PRICE_FIXTURES_DIR and never touches the network
+PRICE_PROVIDER = os.getenv('PRICE_PROVIDER', "yahoo")
+PRICE_FIXTURES_DIR = os.getenv('PRICE_FIXTURES_DIR')
+# days before the last fetch that an update downloads again, so bars published late or revised replace the cached ones
+PRICE_REFETCH_DAYS = int(os.getenv('PRICE_REFETCH_DAYS', 5))
+
+
+class YahooProvider:
+    """Downloads daily bars from Yahoo Finance."""
+
+    def download(self, ticker, start, end):
+        # imported here so reading the local store does not need yfinance
+        import yfinance as yf
+
+        data = yf.download(ticker, start=start, end=end, progress=False)
+        return _flatten(data)
+
+
+class ReplayProvider:
+    """Serves daily bars from fixture files (<ticker>.parquet or <ticker>.csv) on disk.
+
+    A copy of PRICE_CACHE_DIR is a valid fixtures directory, so a cached run can be
+    replayed later with no network.
+    """
+
+    def __init__(self, fixtures_dir):
+        self.fixtures_dir = fixtures_dir
+
+    def download(self, ticker, start, end):
+        parquet_path = os.path.join(self.fixtures_dir, f"{ticker}.parquet")
+        csv_path = os.path.join(self.fixtures_dir, f"{ticker}.csv")
+        if os.path.exists(parquet_path):
+            data = pd.read_parquet(parquet_path)
+        elif os.path.exists(csv_path):
+            data = pd.read_csv(csv_path, index_col="Date", parse_dates=True)
+        else:
+            return _empty_frame()
+
+        data.index = pd.to_datetime(data.index)
+        data.index.name = "Date"
+        return _flatten(data.loc[(data.index >= pd.Timestamp(start)) & (data.index < pd.Timestamp(end))])
+
+
+def _empty_frame():
+    return pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([], name="Date"))
+
+
+def _flatten(data):
+    """Single-level OHLCV columns for one ticker, whatever shape the provider returned."""
+    if data is None or data.empty:
+        return _empty_frame()
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.copy()
+        data.columns = data.columns.get_level_values(0)
+    data = data[[column for column in PRICE_COLUMNS if column in data.columns]]
+    data.index.name = "Date"
+    return data
+
+
+def provider_from_env():
+    if PRICE_PROVIDER == "replay":
+        if not PRICE_FIXTURES_DIR:
+            raise ValueError("PRICE_PROVIDER=replay needs PRICE_FIXTURES_DIR")
+        return ReplayProvider(PRICE_FIXTURES_DIR)
+    return YahooProvider()
+
+
+class PriceStore:
+    """On-disk store of daily bars, one Parquet file per ticker.
+
+    Each ticker has a JSON sidecar recording the window that has already been fetched, so
+    a read for a window the store covers never calls the provider, and a later end date
+    only downloads the bars after the last fetch and appends them.
+    """
+
+    def __init__(self, root=PRICE_CACHE_DIR, provider=None):
+        self.root = root
+        self.provider = provider if provider is not None else provider_from_env()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _paths(self, ticker):
+        return os.path.join(self.root, f"{ticker}.parquet"), os.path.join(self.root, f"{ticker}.json")
+
+    def _lock(self, ticker):
+        with self._locks_lock:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def read(self, ticker):
+        """Everything cached for a ticker (empty frame if nothing is)."""
+        data_path, _ = self._paths(ticker)
+        if not os.path.exists(data_path):
+            return _empty_frame()
+        return pd.read_parquet(data_path)
+
+    def metadata(self, ticker):
+        _, meta_path = self._paths(ticker)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def _write(self, ticker, data, meta):
+        data_path, meta_path = self._paths(ticker)
+        # write to temporary files first so a crash never leaves a half-written cache behind
+        data.to_parquet(data_path + ".tmp")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(data_path + ".tmp", data_path)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def get(self, ticker, start, end):
+        """Daily bars for [start, end), downloading only what the store does not have yet."""
+        start = pd.Timestamp(start).date()
+        # bars after today cannot exist yet, so never ask for the future
+        end = min(pd.Timestamp(end).date(), date.today() + timedelta(days=1))
+        # today's bar may still be forming, so it is never recorded as fetched
+        final_through = min(end, date.today())
+
+        with self._lock(ticker):
+            meta = self.metadata(ticker)
+            data = self.read(ticker) if meta else _empty_frame()
+
+            if meta and date.fromisoformat(meta["start"]) <= start:
+                fetched_through = date.fromisoformat(meta["fetched_through"])
+                if fetched_through < end:
+                    # the last few days again: a bar missing or partial at the last fetch is replaced
+                    refetch_from = max(fetched_through - timedelta(days=PRICE_REFETCH_DAYS), date.fromisoformat(meta["start"]))
+                    print(f"Updating cached {ticker} from {refetch_from} to {end}...")
+                    new_bars = self.provider.download(ticker, refetch_from.isoformat(), end.isoformat())
+                    data = self._append(data, new_bars)
+                    meta["fetched_through"] = max(fetched_through, final_through).isoformat()
+                    self._write(ticker, data, meta)
+            else:
+                # nothing cached, or the cache starts too late: fetch the whole window
+                print(f"Downloading {ticker} from {start} to {end}...")
+                data = self._append(_empty_frame(), self.provider.download(ticker, start.isoformat(), end.isoformat()))
+                meta = {"start": start.isoformat(), "fetched_through": final_through.isoformat()}
+                self._write(ticker, data, meta)
+
+        return data.loc[(data.index >= pd.Timestamp(start)) & (data.index < pd.Timestamp(end))]
+
+    @staticmethod
+    def _append(data, new_bars):
+        if new_bars.empty:
+            return data
+        if data.empty:
+            return new_bars.sort_index()
+        combined = pd.concat([data, new_bars])
+        combined = combined[~combined.index.duplicated(keep="last")]
+        return combined.sort_index()
+
+
+def to_download_frame(data, ticker):
+    """Rebuild the (Price, Ticker) column layout yf.download returns for a single ticker."""
+    data = data.copy()
+    data.columns = pd.MultiIndex.from_product([data.columns, [ticker]], names=["Price", "Ticker"])
+    return data
@@ -0,0 +1,264 @@
+"""Incremental AI refresh: retrain only the tickers whose data or rating is stale, within a time budget.
+
+StockRefreshState records, per stock_ID, the last bar the refresh saw, a hash of the bars,
+when the ticker was last trained, how long that took and the gain it predicted; every
+StockAI.main_ai run writes it, planned or not. The plan takes tickers that were never
+trained, failed last time, whose stored bars changed, are missing bars or are older
+than REFRESH_MAX_AGE_DAYS, most stale and most held first, until the estimated time
+fills the budget. Untouched and failed tickers keep their stored gains, so the ratings are still
+normalised over the whole pool; when some ticker has no stored gain and is not planned,
+a full refresh runs instead.
+
+Run it from cron (or with --daily-at when there is no cron):
+    30 6 * * 1-5  cd /app && python refresh_planner.py --budget 1800 --workers 4
+"""
+import argparse
+import os
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+import db
+
+# seconds of refresh work one planned run may take, summed over the workers
+REFRESH_BUDGET_S = float(os.getenv('REFRESH_BUDGET_S', 1800))
+# a ticker is retrained at least this often even when no new bars arrived
+REFRESH_MAX_AGE_DAYS = int(os.getenv('REFRESH_MAX_AGE_DAYS', 7))
+# cost estimate for a ticker never timed before, until some have been
+DEFAULT_TICKER_SECONDS = 5.0
+
+# staleness of a ticker with no state, ahead of everything else
+NEVER_TRAINED = float("inf")
+
+
+def expected_last_bar(today, end_date):
+    """The last weekday whose daily bar should be complete, within the configured END_DATE."""
+    day = min(today, end_date) - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def _business_days(start, end):
+    """Weekdays after start, up to and including end."""
+    days = 0
+    day = start
+    while day < end:
+        day += timedelta(days=1)
+        if day.weekday() < 5:
+            days += 1
+    return days
+
+
+def load_candidates(conn):
+    """Every StockPool ticker with its refresh state and the number of users holding it."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT sp.stock_ID, sp.ticker_symbol, st.last_bar_date, st.data_hash, st.last_trained_at, st.predicted_gain,
+                   st.duration_s, st.last_error, st.updated_at, COALESCE(h.holders, 0)
+            FROM StockPool sp
+            LEFT JOIN StockRefreshState st ON st.stock_ID = sp.stock_ID
+            LEFT JOIN (
+                SELECT stock, count(DISTINCT user_ID) AS holders FROM StockEntry GROUP BY stock
+            ) h ON h.stock = sp.ticker_symbol
+        """)
+        columns = ["stock_id", "ticker", "last_bar_date", "data_hash", "last_trained_at", "predicted_gain",
+                   "duration_s", "last_error", "updated_at", "holders"]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def bars_hash(bars):
+    """Hash of a ticker's stored bars, None when there are none."""
+    import numpy as np
+
+    import model_store
+
+    if not len(bars):
+        return None
+    return model_store.hash_arrays(bars.index.asi8, bars.to_numpy(dtype=np.float64))
+
+
+def staleness(candidate, expected, now, max_age_days=REFRESH_MAX_AGE_DAYS, current_hash=None):
+    """(how stale, why) of one ticker, (0, None) if it needs no work.
+
+    current_hash is bars_hash of the ticker's bars in the price store now; when it differs
+    from the one recorded at training, bars were revised or re-fetched since.
+    """
+    if candidate["last_trained_at"] is None:
+        return NEVER_TRAINED, "never trained"
+    if candidate["last_error"]:
+        return float(max((now - candidate["updated_at"]).days, 1)), "failed last run"
+    if current_hash and candidate["data_hash"] and current_hash != candidate["data_hash"]:
+        return 1.0, "bars changed"
+
+    behind = _business_days(candidate["last_bar_date"], expected) if candidate["last_bar_date"] else NEVER_TRAINED
+    # already checked after that bar was due: the market was closed, there is nothing new
+    if behind and candidate["updated_at"].date() > expected:
+        behind = 0
+    if behind:
+        return float(behind), f"{behind} bars behind"
+
+    age = (now - candidate["last_trained_at"]).days
+    if age >= max_age_days:
+        return float(age - max_age_days + 1), f"trained {age} days ago"
+    return 0.0, None
+
+
+def make_plan(candidates, budget_s=REFRESH_BUDGET_S, workers=1, today=None, now=None, end_date=None, store=None):
+    """Pick the tickers to refresh, most stale then most held first, until the budget is spent.
+
+    Returns {"tickers": [(stock_id, ticker)], "entries": [...], "deferred": [...], "estimated_s",
+    "baseline_gains": {stock_id: gain} last stored for every ticker, "uncovered": [tickers with
+    no stored gain left out of the plan]}; main_ai overrides the refreshed ones, so a ticker
+    that fails keeps its previous gain.
+    """
+    import StockAI
+
+    today = today or date.today()
+    now = now or datetime.now().astimezone()
+    end_date = end_date or date.fromisoformat(StockAI.END_DATE)
+    expected = expected_last_bar(today, end_date)
+    store = store or StockAI.get_price_store()
+
+    known = [c["duration_s"] for c in candidates if c["duration_s"]]
+    default_cost = statistics.median(known) if known else DEFAULT_TICKER_SECONDS
+
+    stale = []
+    for candidate in candidates:
+        # only tickers trained with a recorded hash can be compared, the rest are not read
+        current_hash = bars_hash(store.read(candidate["ticker"])) if candidate["data_hash"] else None
+        score, reason = staleness(candidate, expected, now, current_hash=current_hash)
+        if reason:
+            stale.append(dict(candidate, staleness=score, reason=reason,
+                              estimated_s=candidate["duration_s"] or default_cost))
+    stale.sort(key=lambda c: (-c["staleness"], -c["holders"], c["ticker"]))
+
+    # the workers run tickers side by side, so they share out the budget
+    capacity = budget_s * max(workers, 1)
+    planned, deferred, spent = [], [], 0.0
+    for candidate in stale:
+        # the most urgent ticker always runs, even if it alone is over budget
+        if planned and spent + candidate["estimated_s"] > capacity:
+            deferred.append(candidate)
+            continue
+        planned.append(candidate)
+        spent += candidate["estimated_s"]
+
+    return {
+        "tickers": [(c["stock_id"], c["ticker"]) for c in planned],
+        "entries": [{key: c[key] for key in ("ticker", "reason", "holders", "estimated_s")} for c in planned],
+        "deferred": [c["ticker"] for c in deferred],
+        "estimated_s": round(spent / max(workers, 1), 1),
+        "baseline_gains": {
+            c["stock_id"]: c["predicted_gain"]
+            for c in candidates if c["predicted_gain"] is not None
+        },
+        "uncovered": [c["ticker"] for c in deferred if c["predicted_gain"] is None],
+    }
+
+
+def record_results(conn, tickers, gains, ticker_seconds, failed, store):
+    """Store what a main_ai run saw and produced for each (stock_id, ticker) it ran."""
+    rows = []
+    for stock_id, ticker in tickers:
+        error = failed.get(ticker)
+        bars = store.read(ticker)
+        last_bar = bars.index[-1].date() if len(bars) else None
+        # the hash is of the bars the model was trained on, a failed ticker keeps the previous one
+        data_hash = None if error else bars_hash(bars)
+        gain = None if error else gains.get(stock_id)
+        seconds = ticker_seconds.get(stock_id)
+        # gains are numpy scalars, which psycopg2 cannot adapt (float32) or renders as np.float64(...)
+        rows.append((stock_id, last_bar, data_hash, error, None if gain is None else float(gain),
+                     None if seconds is None else float(seconds), error))
+
+    with conn.cursor() as cur:
+        # one statement for the whole run; a failed ticker keeps its last good gain and training time
+        execute_values(cur, """
+            INSERT INTO StockRefreshState (stock_ID, last_bar_date, data_hash, last_trained_at, predicted_gain, duration_s, last_error, updated_at)
+            VALUES %s
+            ON CONFLICT (stock_ID) DO UPDATE SET
+                last_bar_date = COALESCE(EXCLUDED.last_bar_date, StockRefreshState.last_bar_date),
+                data_hash = COALESCE(EXCLUDED.data_hash, StockRefreshState.data_hash),
+                last_trained_at = COALESCE(EXCLUDED.last_trained_at, StockRefreshState.last_trained_at),
+                predicted_gain = COALESCE(EXCLUDED.predicted_gain, StockRefreshState.predicted_gain),
+                duration_s = COALESCE(EXCLUDED.duration_s, StockRefreshState.duration_s),
+                last_error = EXCLUDED.last_error,
+                updated_at = now()
+        """, rows, template="(%s, %s::date, %s, CASE WHEN %s::text IS NULL THEN now() END, %s::float8, %s::float8, %s, now())",
+            page_size=1000)
+    conn.commit()
+
+
+def run_planned(workers=None, budget_s=REFRESH_BUDGET_S, progress=None, dry_run=False):
+    """Plan and run StockAI.main_ai on the planned tickers only; main_ai records their new state.
+
+    Ratings are normalised over every gain passed in, so when a ticker would be left with
+    no gain at all (never trained and deferred), the whole pool is refreshed instead.
+    """
+    import StockAI
+
+    conn = db.connect()
+    try:
+        plan = make_plan(load_candidates(conn), budget_s, workers or StockAI.AI_WORKERS)
+    finally:
+        conn.close()
+
+    print(f"Planned {len(plan['tickers'])} tickers (~{plan['estimated_s']}s), deferred {len(plan['deferred'])}")
+    for entry in plan["entries"]:
+        print(f"  {entry['ticker']:<8} {entry['reason']:<20} held by {entry['holders']}")
+    if plan["uncovered"]:
+        print(f"{len(plan['uncovered'])} deferred tickers have no stored gain, running a full refresh instead")
+    if dry_run or not plan["tickers"]:
+        return {"planned": plan["entries"], "deferred": plan["deferred"], "uncovered": plan["uncovered"], "ran": False}
+
+    if plan["uncovered"]:
+        result = StockAI.main_ai(workers=workers, progress=progress)
+    else:
+        result = StockAI.main_ai(workers=workers, progress=progress, tickers=plan["tickers"],
+                                 baseline_gains=plan["baseline_gains"])
+    return {"planned": plan["entries"], "deferred": plan["deferred"], "uncovered": plan["uncovered"], "ran": True,
+            "full": bool(plan["uncovered"]), "total_s": result["total_s"], "failed": result["failed"]}
+
+
+def _next_run(at, now):
+    hour, minute = (int(part) for part in at.split(":"))
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return run_at if run_at > now else run_at + timedelta(days=1)
+
+
+def scheduled_run(workers, budget_s):
+    """One planned run recorded as an AIJob, so it never overlaps a refresh started from the API."""
+    import jobs
+
+    conn = db.connect()
+    try:
+        job_id = jobs.create_job(conn)
+    finally:
+        conn.close()
+    if job_id is None:
+        print("An AI refresh is already queued or running, skipping this run.")
+        return
+    jobs.run_job(job_id, workers, budget_s)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh only the stale AI ratings, within a time budget.")
+    parser.add_argument("--budget", type=float, default=REFRESH_BUDGET_S, help="seconds of work (default: REFRESH_BUDGET_S)")
+    parser.add_argument("--workers", type=int, help="tickers processed at once (default: AI_WORKERS)")
+    parser.add_argument("--dry-run", action="store_true", help="print the plan without running it")
+    parser.add_argument("--daily-at", metavar="HH:MM", help="stay running and refresh every day at this local time")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        run_planned(args.workers, args.budget, dry_run=True)
+    elif args.daily_at:
+        while True:
+            run_at = _next_run(args.daily_at, datetime.now())
+            print(f"Next refresh at {run_at:%Y-%m-%d %H:%M}")
+            time.sleep((run_at - datetime.now()).total_seconds())
+            scheduled_run(args.workers, args.budget)
+    else:
+        scheduled_run(args.workers, args.budget)
@@ -0,0 +1,92 @@
+import functools
+import hashlib
+import os
+import threading
+import time
+
+from flask import current_app, request
+
+# seconds browsers and proxies may reuse a cached reference response without asking
+REFERENCE_MAX_AGE = int(os.getenv('REFERENCE_MAX_AGE', 300))
+# seconds this process keeps a cached body before rebuilding it, a backstop to the version check
+REFERENCE_CACHE_TTL = float(os.getenv('REFERENCE_CACHE_TTL', 3600))
+# seconds between reads of the data version; an entry built at an older version is rebuilt
+REFERENCE_VERSION_CHECK_S = float(os.getenv('REFERENCE_VERSION_CHECK_S', 5))
+
+
+class ResponseCache:
+    """Per-process memo of read-mostly GET responses, keyed by endpoint and query string.
+
+    Only 200 responses are kept. Every response served from it carries an ETag (a hash of the
+    body) and Cache-Control, and a matching If-None-Match gets a 304 with no body.
+
+    version, if given, returns the current version of the data behind the responses; it is
+    read at most every version_check_s seconds, and entries built at another version are
+    rebuilt, so writes made by any process show up within that interval. Entries also
+    expire after ttl seconds.
+    """
+
+    def __init__(self, ttl=REFERENCE_CACHE_TTL, version=None, version_check_s=REFERENCE_VERSION_CHECK_S):
+        self.ttl = ttl
+        self.version_check_s = version_check_s
+        self._version_of = version
+        self._version = None
+        self._version_checked_at = None
+        self._lock = threading.Lock()
+        self._entries = {}  # (endpoint, query string) -> (body, mimetype, etag, stored_at, version)
+        self._counts = {"hits": 0, "misses": 0, "not_modified": 0, "stale_version": 0}
+
+    def _current_version(self):
+        if self._version_of is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_s:
+                return self._version
+        # read outside the lock, a slow query does not hold up requests served from memory
+        version = self._version_of()
+        with self._lock:
+            self._version, self._version_checked_at = version, now
+        return version
+
+    def cached(self, max_age=REFERENCE_MAX_AGE):
+        """Decorator for a GET view whose response only depends on its URL."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                key = (request.endpoint, request.query_string)
+                version = self._current_version()
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry and entry[4] != version:
+                        entry = None
+                        self._counts["stale_version"] += 1
+                    if entry and time.monotonic() - entry[3] >= self.ttl:
+                        entry = None
+                    self._counts["hits" if entry else "misses"] += 1
+
+                if entry is None:
+                    # built outside the lock, two first requests may both query, the last one wins
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    body = response.get_data()
+                    entry = (body, response.mimetype, hashlib.sha1(body).hexdigest(), time.monotonic(), version)
+                    with self._lock:
+                        self._entries[key] = entry
+
+                body, mimetype, etag, _, _ = entry
+                response = current_app.response_class(body, mimetype=mimetype)
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = f"public, max-age={max_age}"
+                response.make_conditional(request)
+                if response.status_code == 304:
+                    with self._lock:
+                        self._counts["not_modified"] += 1
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, entries=len(self._entries), ttl_s=self.ttl, version=self._version)
@@ -0,0 +1,131 @@
+import heapq
+import threading
+
+from psycopg2.extras import RealDictCursor
+
+
+# the ratings, with their stock and industry, that the index ranks
+RATINGS_QUERY = """
+    SELECT ai.industry_id AS industry_id,
+           sp.ticker_symbol AS ticker,
+           sp.name AS name,
+           i.name AS industry,
+           ai.rating AS rating
+    FROM AISuggestions ai
+    JOIN StockPool sp ON ai.stock_id = sp.stock_id
+    JOIN Industry i ON ai.industry_id = i.industry_id
+"""
+
+# the user's holdings and the ratings version in one round trip
+HOLDINGS_QUERY = """
+    SELECT v.version, s.stock, s.industry_ID
+    FROM AISuggestionsVersion v
+    LEFT JOIN StockEntry s ON s.user_ID = %s
+"""
+
+
+class SuggestionIndex:
+    """Per-industry ranked candidate lists for /api/suggestions, held in memory.
+
+    Ratings only change when the AI refresh rewrites AISuggestions. A statement trigger
+    bumps AISuggestionsVersion on every write to AISuggestions, StockPool or Industry, and
+    each request reads that version together with the user's holdings, so a stale index is
+    rebuilt by the first request that notices, in every process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        # (candidates by industry_id, all candidates), both ordered by rating then ticker
+        self._index = ({}, [])
+
+    def _rebuild(self, conn, version):
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(RATINGS_QUERY)
+            self.load(cur.fetchall(), version)
+
+    def is_current(self, version):
+        return version == self._version
+
+    def load(self, rows, version):
+        """Replace the index with RATINGS_QUERY's rows (dicts) read at the given ratings version."""
+        rows = sorted(rows, key=self._rank)
+        by_industry = {}
+        for row in rows:
+            by_industry.setdefault(row["industry_id"], []).append(row)
+
+        # swap in the new lists together so readers never see a half-built index
+        self._index = (by_industry, rows)
+        self._version = version
+
+    def _ensure_current(self, conn, version):
+        if version == self._version:
+            return
+        with self._lock:
+            # another request may have rebuilt it while this one waited
+            if version != self._version:
+                self._rebuild(conn, version)
+
+    def suggest(self, conn, user_id, limit=3):
+        """Top-rated stocks the user does not hold, favouring their least-held industries.
+
+        Candidates come from the industries the user holds the fewest lots in, and the rest
+        are filled from all industries. Returns copies of the cached rows.
+        """
+        with conn.cursor() as cur:
+            cur.execute(HOLDINGS_QUERY, (user_id,))
+            rows = cur.fetchall()
+
+        version = rows[0][0] if rows else None
+        self._ensure_current(conn, version)
+        return self.pick(rows, limit)
+
+    def pick(self, holdings, limit=3):
+        """Rank against the current index, given HOLDINGS_QUERY's (version, stock, industry_id) rows."""
+        by_industry, overall = self._index
+
+        held = set()
+        industry_counts = {}
+        for _, stock, industry_id in holdings:
+            if stock is None:
+                continue
+            held.add(stock)
+            industry_counts[industry_id] = industry_counts.get(industry_id, 0) + 1
+
+        picked = []
+        if industry_counts:
+            min_count = min(industry_counts.values())
+            min_industries = [industry_id for industry_id, count in industry_counts.items() if count == min_count]
+            candidates = heapq.merge(*(by_industry.get(industry_id, []) for industry_id in min_industries),
+                                     key=self._rank)
+            picked = self._take(candidates, held, limit)
+
+        # If less than the limit, fill with other industries
+        if len(picked) < limit:
+            already = held | {row["ticker"] for row in picked}
+            picked += self._take(overall, already, limit - len(picked))
+
+        return [{key: row[key] for key in ("ticker", "name", "industry", "rating")} for row in picked]
+
+    @staticmethod
+    def _rank(row):
+        return -row["rating"], row["ticker"]
+
+    @staticmethod
+    def _take(candidates, excluded, limit):
+        picked = []
+        for row in candidates:
+            if len(picked) == limit:
+                break
+            if row["ticker"] not in excluded:
+                picked.append(row)
+        return picked
+
+
+def with_labels(suggestions):
+    """Turn the 0-5 ratings into the labels and confidence the frontend shows."""
+    for suggestion in suggestions:
+        rating = suggestion['rating']
+        suggestion['confidence'] = int((rating / 5) * 100)
+        suggestion['rating'] = "Strong Buy" if rating >= 4.5 else "Buy" if rating >= 4.0 else "Hold"
+    return suggestions
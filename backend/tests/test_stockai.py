@@ -0,0 +1,46 @@
+"""Offline checks of StockAI.main_ai on synthetic bars; the database calls are replaced."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import refresh_planner  # noqa: E402
+import StockAI  # noqa: E402
+from bench.synthetic import synthetic_universe  # noqa: E402
+
+
+class _Connection:
+    def close(self):
+        pass
+
+
+def _offline(monkeypatch, frames):
+    written = {}
+    monkeypatch.setattr(StockAI, "fetch_stock_data", lambda ticker, *args: frames[ticker].copy())
+    monkeypatch.setattr(StockAI, "get_ticker_industries", lambda: {})
+    monkeypatch.setattr(StockAI, "update_ai_suggestions", lambda gains: written.update(gains) or len(gains))
+    monkeypatch.setattr(StockAI, "get_db_connection", _Connection)
+    monkeypatch.setattr(refresh_planner, "record_results", lambda *args: None)
+    return written
+
+
+def test_pooled_run_without_model_cache(monkeypatch):
+    frames = synthetic_universe(3, days=400, seed=2)
+    written = _offline(monkeypatch, frames)
+    monkeypatch.setattr(StockAI, "AI_MODEL_CACHE", False)
+
+    tickers = list(enumerate(frames, start=1))
+    result = StockAI.main_ai(workers=1, tickers=tickers, engine="pooled")
+
+    assert result["failed"] == {}
+    assert set(result["gains"]) == {stock_id for stock_id, _ in tickers}
+    assert written == result["gains"]
+
+
+def test_empty_pool_returns_an_empty_summary(monkeypatch):
+    _offline(monkeypatch, {})
+    monkeypatch.setattr(StockAI, "get_stock_tickers_from_db", lambda: [])
+
+    result = StockAI.main_ai(workers=1)
+
+    assert result["gains"] == {} and result["failed"] == {} and result["total_s"] == 0
@@ -0,0 +1,125 @@
+import io
+import os
+
+# same rules as /api/addstock
+SYMBOL_PATTERN = r'^[A-Z0-9]{1,5}([.\-][A-Z0-9]{1,3})?$'
+FIELDS = ["stock", "industry_id", "number", "price_per_share", "date"]
+
+# rows accepted in one import
+IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', 50000))
+# column limits of StockEntry: number INT, price_per_share DECIMAL(10,2)
+MAX_NUMBER = 2 ** 31 - 1
+MAX_PRICE = 10 ** 8
+
+
+class InvalidUpload(Exception):
+    """The upload as a whole cannot be read (bad CSV, wrong shape, too many rows)."""
+
+
+def parse_trades(body, content_type):
+    """DataFrame of the uploaded trades, every column as text. Accepts CSV or a JSON array of objects."""
+    # imported here so pandas is only loaded by workers that run an import
+    import pandas as pd
+
+    if "json" in content_type:
+        import json
+        try:
+            rows = json.loads(body)
+        except ValueError as e:
+            raise InvalidUpload(f"Invalid JSON: {e}")
+        if isinstance(rows, dict):
+            rows = rows.get("trades")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise InvalidUpload("Expected a JSON array of trade objects")
+        frame = pd.DataFrame(rows, columns=FIELDS, dtype=object)
+    else:
+        try:
+            frame = pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False, skipinitialspace=True)
+        except (ValueError, pd.errors.ParserError) as e:
+            raise InvalidUpload(f"Invalid CSV: {e}")
+        frame.columns = [str(column).strip().lower() for column in frame.columns]
+        missing = [field for field in FIELDS if field not in frame.columns]
+        if missing:
+            raise InvalidUpload(f"Missing columns: {', '.join(missing)}")
+
+    if len(frame) > IMPORT_MAX_ROWS:
+        raise InvalidUpload(f"At most {IMPORT_MAX_ROWS} rows per import")
+    return frame[FIELDS].fillna("").astype(str).apply(lambda column: column.str.strip())
+
+
+def validate_trades(frame, industry_ids):
+    """Check every row at once. Returns (valid rows with typed columns, per-row errors).
+
+    Errors are [{"row": n, "errors": [...]}] with n counting data rows from 1.
+    """
+    import numpy as np
+    import pandas as pd
+
+    number = pd.to_numeric(frame["number"], errors="coerce")
+    price = pd.to_numeric(frame["price_per_share"], errors="coerce")
+    industry = pd.to_numeric(frame["industry_id"], errors="coerce")
+    date = pd.to_datetime(frame["date"], format="%Y-%m-%d", errors="coerce")
+
+    # one boolean array per rule, True where the row breaks it
+    checks = [
+        ((frame == "").any(axis=1), "All fields (symbol, industry, number, price_per_share, date) are required"),
+        (~frame["stock"].str.fullmatch(SYMBOL_PATTERN), "Invalid stock ticker symbol"),
+        (~((number > 0) & (number % 1 == 0) & (number <= MAX_NUMBER)), "Number must be a positive integer"),
+        (~((price > 0) & (price < MAX_PRICE)), "Invalid price per share"),
+        (~industry.isin(list(industry_ids)), "Unknown industry"),
+        (date.isna(), "Date must be YYYY-MM-DD"),
+    ]
+    checks = [(mask.fillna(True).to_numpy(dtype=bool), message) for mask, message in checks]
+    bad = np.logical_or.reduce([mask for mask, _ in checks])
+
+    errors = []
+    # only the failing rows are visited one by one
+    for position in bad.nonzero()[0]:
+        errors.append({
+            "row": int(position) + 1,
+            "errors": [message for mask, message in checks if mask[position]],
+        })
+
+    ok = pd.Series(~bad, index=frame.index)
+    valid = pd.DataFrame({
+        "row_no": ok.to_numpy().nonzero()[0] + 1,
+        "industry_id": industry[ok].astype("int64"),
+        "stock": frame.loc[ok, "stock"],
+        "number": number[ok].astype("int64"),
+        "date": date[ok].dt.strftime("%Y-%m-%d"),
+        "price_per_share": price[ok].round(2),
+    })
+    return valid, errors
+
+
+def load_trades(conn, user_id, valid):
+    """COPY the valid rows into a staging table and move them into StockEntry in one transaction.
+
+    Returns the number of lots inserted. The caller commits.
+    """
+    buffer = io.StringIO()
+    valid.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE StockEntryImport (
+                row_no INT NOT NULL,
+                Industry_ID INT NOT NULL,
+                stock VARCHAR(255) NOT NULL,
+                number INT NOT NULL,
+                date DATE NOT NULL,
+                price_per_share DECIMAL(10,2) NOT NULL
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert(
+            "COPY StockEntryImport (row_no, Industry_ID, stock, number, date, price_per_share) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+        cur.execute("""
+            INSERT INTO StockEntry (user_ID, Industry_ID, stock, number, date, price_per_share)
+            SELECT %s, Industry_ID, stock, number, date, price_per_share
+            FROM StockEntryImport
+            ORDER BY row_no
+        """, (user_id,))
+        return cur.rowcount
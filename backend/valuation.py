@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def value_portfolio(lots, prices):
+    """Market value, unrealised P&L and industry weights of a user's lots in one vectorised pass.
+
+    lots is a list of dicts with entry_ID, stock, name (the industry), number and
+    price_per_share, as /api/portfolio returns them; prices maps symbol to latest price.
+    Lots without a price keep a null market value and are left out of the totals and weights.
+    """
+    if not lots:
+        return {"positions": [], "totals": _totals(0.0, 0.0, 0), "industry_weights": []}
+
+    number = np.array([lot["number"] for lot in lots], dtype=np.float64)
+    cost_per_share = np.array([float(lot["price_per_share"]) for lot in lots], dtype=np.float64)
+    last_price = np.array([prices.get(lot["stock"], np.nan) for lot in lots], dtype=np.float64)
+
+    cost_basis = number * cost_per_share
+    market_value = number * last_price
+    pnl = market_value - cost_basis
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pnl_pct = np.where(cost_basis > 0, pnl / cost_basis * 100, np.nan)
+
+    priced = ~np.isnan(market_value)
+    total_value = float(market_value[priced].sum())
+    total_cost = float(cost_basis[priced].sum())
+
+    industries, industry_idx = np.unique([lot["name"] for lot in lots], return_inverse=True)
+    industry_value = np.bincount(industry_idx[priced], weights=market_value[priced], minlength=len(industries))
+    weights = industry_value / total_value if total_value > 0 else np.zeros_like(industry_value)
+
+    positions = []
+    for i, lot in enumerate(lots):
+        positions.append(dict(
+            lot,
+            price_per_share=float(cost_per_share[i]),
+            last_price=_num(last_price[i]),
+            cost_basis=_num(cost_basis[i]),
+            market_value=_num(market_value[i]),
+            unrealized_pnl=_num(pnl[i]),
+            unrealized_pnl_pct=_num(pnl_pct[i]),
+        ))
+
+    industry_weights = [
+        {"industry": str(industry), "market_value": round(float(value), 2), "weight": round(float(weight), 4)}
+        for industry, value, weight in sorted(zip(industries, industry_value, weights), key=lambda row: -row[1])
+    ]
+
+    return {
+        "positions": positions,
+        "totals": _totals(total_value, total_cost, int((~priced).sum())),
+        "industry_weights": industry_weights,
+    }
+
+
+def _totals(total_value, total_cost, unpriced):
+    pnl = total_value - total_cost
+    return {
+        "market_value": round(total_value, 2),
+        "cost_basis": round(total_cost, 2),
+        "unrealized_pnl": round(pnl, 2),
+        "unrealized_pnl_pct": round(pnl / total_cost * 100, 2) if total_cost > 0 else None,
+        "unpriced_lots": unpriced,
+    }
+
+
+def _num(value):
+    """Rounded float for JSON, None where the value is missing."""
+    return None if np.isnan(value) else round(float(value), 2)
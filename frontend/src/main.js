@@ -20,13 +20,32 @@ app.mount('#app')
 
 axios.interceptors.response.use(
     (response) => response, // If the response is successful, return it
-    (error) => {
+    async (error) => {
+      const original = error.config;
+      const refreshToken = localStorage.getItem("refresh_token");
+      // an expired access token is renewed once with the refresh token, without asking for the password
+      if (error.response && error.response.status === 401 && refreshToken && original && !original._retried && !original.url.endsWith("/api/refresh")) {
+        original._retried = true;
+        try {
+          const response = await axios.post(`${process.env.VUE_APP_URL}/api/refresh`, {}, {
+            headers: { Authorization: `Bearer ${refreshToken}` },
+          });
+          const token = response.data.token;
+          localStorage.setItem("token", token);
+          axios.defaults.headers.common["Authorization"] = `Bearer ${token}`;
+          original.headers["Authorization"] = `Bearer ${token}`;
+          return axios(original);
+        } catch (refreshError) {
+          // fall through to the login redirect below
+        }
+      }
       if (error.response && error.response.status === 401) {
         // If the backend returns 401 Unauthorized
         localStorage.removeItem("token"); // Clear token from localStorage
+        localStorage.removeItem("refresh_token");
         delete axios.defaults.headers.common["Authorization"]; // Remove the header
         router.push("/login"); // Redirect to login page
       }
       return Promise.reject(error);
     }
-  );
\ No newline at end of file
+  );